@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='ai_prompt_token_budget',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -86,6 +86,9 @@ class Organization(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
 
+    # Max tokens per AI prompt; falls back to settings.AI_ORG_PROMPT_TOKEN_BUDGET
+    ai_prompt_token_budget = models.PositiveIntegerField(null=True, blank=True)
+
     objects = OrganizationManager()
 
     USERNAME_FIELD = "email"
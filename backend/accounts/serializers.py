@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import User, Organization
 from django.contrib.auth.hashers import make_password
+from django.conf import settings
 
 
 
@@ -117,5 +118,14 @@ class OrganizationProfileSerializer(serializers.ModelSerializer):
             "industry",
             "organization_size",
             "registration_id",
+            "ai_prompt_token_budget",
         ]
         read_only_fields = ["email", "registration_id"]
+
+    def validate_ai_prompt_token_budget(self, value):
+        # null/0 fall back to the global budget, which is also the cap
+        if value is not None and value > settings.AI_ORG_PROMPT_TOKEN_BUDGET:
+            raise serializers.ValidationError(
+                f"Must be at most {settings.AI_ORG_PROMPT_TOKEN_BUDGET} tokens."
+            )
+        return value
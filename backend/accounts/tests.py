@@ -1,3 +1,44 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from .models import Organization
+
+
+@override_settings(AI_ORG_PROMPT_TOKEN_BUDGET=8000)
+class OrganizationProfileTests(TestCase):
+    def setUp(self):
+        self.org = Organization.objects.create_user(
+            email="org@example.com",
+            password="secret",
+            admin_name="Admin",
+            designation="HR",
+            phone_number="1",
+            organization_name="Acme",
+            industry="IT",
+            organization_size=10,
+            registration_id="R1",
+        )
+        refresh = RefreshToken.for_user(self.org)
+        refresh["user_type"] = "organization"
+        self.headers = {"Authorization": f"Bearer {refresh.access_token}"}
+
+    def set_budget(self, value):
+        return self.client.put(
+            "/api/org/profile/", {"ai_prompt_token_budget": value},
+            content_type="application/json", headers=self.headers,
+        )
+
+    def test_token_budget_is_writable_up_to_the_global_cap(self):
+        self.assertEqual(self.set_budget(2000).status_code, 200)
+        self.org.refresh_from_db()
+        self.assertEqual(self.org.ai_prompt_token_budget, 2000)
+
+        self.assertEqual(self.set_budget(None).status_code, 200)
+        self.org.refresh_from_db()
+        self.assertIsNone(self.org.ai_prompt_token_budget)
+
+    def test_token_budget_out_of_range_is_rejected(self):
+        for value in (-1, 8001):
+            response = self.set_budget(value)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("ai_prompt_token_budget", response.data)
@@ -0,0 +1,76 @@
+import asyncio
+import json
+from contextlib import suppress
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .utils.realtime import authenticate_token, notification_messages
+
+
+def _authenticate(token):
+    # Outside Django's request cycle: don't keep the connection open for
+    # the lifetime of the socket
+    try:
+        return authenticate_token(token)
+    finally:
+        close_old_connections()
+
+
+def _auth_token(event):
+    """
+    The token from the client's first message, {"type": "auth", "token": ...}
+    """
+    if event is None or event["type"] != "websocket.receive":
+        return None
+    try:
+        message = json.loads(event.get("text") or "")
+    except ValueError:
+        return None
+    if not isinstance(message, dict) or message.get("type") != "auth":
+        return None
+    return message.get("token")
+
+
+async def notifications_websocket(scope, receive, send):
+    """
+    ASGI app for ws/notifications/. The client authenticates with a first
+    message {"type": "auth", "token": <access token>} (closed with 4401
+    otherwise), then gets JSON messages: {"type": "unread_count", ...},
+    {"type": "notification", "notification": {...}} for each new one and
+    {"type": "ping"} as keepalive. Anything else the client sends is ignored.
+    """
+    if (await receive())["type"] != "websocket.connect":
+        return
+    await send({"type": "websocket.accept"})
+    try:
+        event = await asyncio.wait_for(receive(), settings.NOTIFICATION_AUTH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        event = None
+    if event is not None and event["type"] == "websocket.disconnect":
+        return
+    user = await sync_to_async(_authenticate)(_auth_token(event))
+    if user is None:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+
+    messages = notification_messages(user)
+
+    async def push():
+        first = True
+        async for message in messages:
+            await send({"type": "websocket.send", "text": json.dumps(message or {"type": "ping"})})
+            if first:
+                await sync_to_async(close_old_connections)()
+                first = False
+
+    pusher = asyncio.create_task(push())
+    try:
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        pusher.cancel()
+        with suppress(asyncio.CancelledError):
+            await pusher
+        await messages.aclose()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from groups.utils.activity import replay_spool
+
+
+class Command(BaseCommand):
+    help = "Write activity log rows spooled to ACTIVITY_LOG_SPOOL_PATH when the database refused them"
+
+    def handle(self, *args, **options):
+        written, spooled = replay_spool()
+        self.stdout.write(f"Wrote {written} spooled activity log rows, {spooled} still spooled")
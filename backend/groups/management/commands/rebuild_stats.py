@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from groups.utils.stats import rebuild_group_stats, rebuild_document_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the GroupStats / DocumentStats counters from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--groups", type=int, nargs="*", help="Only these group ids")
+        parser.add_argument("--documents", type=int, nargs="*", help="Only these document ids")
+
+    def handle(self, *args, **options):
+        group_ids, document_ids = options["groups"], options["documents"]
+        everything = group_ids is None and document_ids is None
+
+        groups = rebuild_group_stats(group_ids) if everything or group_ids else 0
+        documents = rebuild_document_stats(document_ids) if everything or document_ids else 0
+        self.stdout.write(f"Rebuilt stats for {groups} groups and {documents} documents")
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+def mark_extracted_documents(apps, schema_editor):
+    Document = apps.get_model('groups', 'Document')
+    Document.objects.exclude(content__isnull=True).exclude(content='').update(extraction_status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0004_document_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='extraction_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='extraction_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='extraction_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(mark_extracted_documents, migrations.RunPython.noop),
+    ]
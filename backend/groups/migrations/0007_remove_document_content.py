@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0006_document_page_count_text_length'),
+        ('pramiti_ai', '0008_documentpage'),  # pages are backfilled from content first
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='document',
+            name='content',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0008_documentblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentblob',
+            name='preview_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
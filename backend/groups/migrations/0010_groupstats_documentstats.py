@@ -0,0 +1,78 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, key):
+    return Coalesce(Subquery(
+        queryset.filter(**{key: OuterRef('pk')}).order_by().values(key).annotate(n=Count('id')).values('n')
+    ), 0)
+
+
+def backfill_stats(apps, schema_editor):
+    Group = apps.get_model('groups', 'Group')
+    GroupMember = apps.get_model('groups', 'GroupMember')
+    Document = apps.get_model('groups', 'Document')
+    DocumentReadStatus = apps.get_model('groups', 'DocumentReadStatus')
+    GroupStats = apps.get_model('groups', 'GroupStats')
+    DocumentStats = apps.get_model('groups', 'DocumentStats')
+    AIQuestion = apps.get_model('pramiti_ai', 'AIQuestion')
+
+    groups = Group.objects.annotate(
+        n_members=_count(GroupMember.objects.filter(status='active'), 'group'),
+        n_documents=_count(Document.objects.all(), 'group'),
+        n_questions=_count(AIQuestion.objects.all(), 'group'),
+    ).values_list('id', 'n_members', 'n_documents', 'n_questions')
+    GroupStats.objects.bulk_create(
+        [GroupStats(group_id=g, members_count=m, documents_count=d, questions_count=q) for g, m, d, q in groups.iterator()],
+        batch_size=1000,
+    )
+
+    reads = DocumentReadStatus.objects.filter(document=OuterRef('pk')).order_by().values('document')
+    documents = Document.objects.annotate(
+        n_questions=_count(AIQuestion.objects.all(), 'document'),
+        n_readers=_count(DocumentReadStatus.objects.filter(read_time_seconds__gt=0), 'document'),
+        n_completed=_count(DocumentReadStatus.objects.filter(is_completed=True), 'document'),
+        read_seconds=Coalesce(Subquery(reads.annotate(s=Sum('read_time_seconds')).values('s')), 0),
+    ).values_list('id', 'n_questions', 'n_readers', 'n_completed', 'read_seconds')
+    DocumentStats.objects.bulk_create(
+        [
+            DocumentStats(document_id=d, questions_count=q, readers_count=r, completed_count=c, total_read_seconds=s)
+            for d, q, r, c, s in documents.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0009_documentblob_preview_count'),
+        ('pramiti_ai', '0009_move_pages_and_chunks_to_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentStats',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='groups.document')),
+                ('questions_count', models.PositiveIntegerField(default=0)),
+                ('readers_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('total_read_seconds', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='groups.group')),
+                ('members_count', models.PositiveIntegerField(default=0)),
+                ('documents_count', models.PositiveIntegerField(default=0)),
+                ('questions_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
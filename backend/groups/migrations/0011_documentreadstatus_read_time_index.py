@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0010_groupstats_documentstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentreadstatus',
+            index=models.Index(fields=['document', 'read_time_seconds'], name='groups_docu_documen_c458ad_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_actors(apps, schema_editor):
+    """
+    Copy the generic (content_type, object_id) actor into the typed column
+    for its model, skipping actors that no longer exist
+    """
+    ActivityLog = apps.get_model('groups', 'ActivityLog')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    for column, model in (
+        ('actor_user_id', apps.get_model(settings.AUTH_USER_MODEL)),
+        ('actor_org_id', apps.get_model('accounts', 'Organization')),
+    ):
+        content_type = ContentType.objects.filter(
+            app_label=model._meta.app_label, model=model._meta.model_name
+        ).first()
+        if content_type is None:
+            continue
+        ActivityLog.objects.filter(
+            content_type=content_type,
+            object_id__in=model.objects.values('id'),
+        ).update(**{column: models.F('object_id')})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_organization_ai_prompt_token_budget'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('groups', '0013_activitylog_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='actor_org',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity_logs', to='accounts.organization'),
+        ),
+        migrations.AddField(
+            model_name='activitylog',
+            name='actor_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity_logs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_actors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['document', 'timestamp'], name='groups_acti_documen_400f18_idx'),
+        ),
+    ]
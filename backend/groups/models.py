@@ -1,11 +1,43 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.conf import settings
+import os
 import string
 import random
 
 # =======================
 # GROUP
 # =======================
+def _count_per_group(queryset):
+    """
+    Correlated COUNT of queryset rows for the outer Group
+    """
+    counts = queryset.filter(group=models.OuterRef("pk")).order_by().values("group").annotate(
+        total=models.Count("*")
+    ).values("total")
+    return Coalesce(models.Subquery(counts), 0)
+
+
+class GroupQuerySet(models.QuerySet):
+    def with_counts(self):
+        """
+        Annotate members / documents / AI question counts in the same query
+        (read through the Group.*_count properties)
+        """
+        from pramiti_ai.models import AIQuestion
+
+        # Read from GroupStats; the COUNT subqueries (one per relation, joining
+        # all three would multiply rows) only cover groups without a stats row
+        return self.annotate(
+            _members_count=Coalesce(
+                models.F('stats__members_count'),
+                _count_per_group(GroupMember.objects.filter(status='active')),
+            ),
+            _documents_count=Coalesce(models.F('stats__documents_count'), _count_per_group(Document.objects.all())),
+            _questions_count=Coalesce(models.F('stats__questions_count'), _count_per_group(AIQuestion.objects.all())),
+        )
+
+
 class Group(models.Model):
     STATUS_CHOICES = (
         ('active', 'Active'),
@@ -54,6 +86,8 @@ class Group(models.Model):
 
     tags = models.JSONField(default=list, blank=True)
 
+    objects = GroupQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -71,12 +105,19 @@ class Group(models.Model):
             if not Group.objects.filter(code=code).exists():
                 return code
 
+    # The counts come from Group.objects.with_counts() when annotated,
+    # otherwise each one runs its own COUNT query
+
     @property
     def members_count(self):
+        if hasattr(self, '_members_count'):
+            return self._members_count
         return self.memberships.filter(status='active').count()
 
     @property
     def documents_count(self):
+        if hasattr(self, '_documents_count'):
+            return self._documents_count
         return self.documents.count()
 
     @property
@@ -84,6 +125,8 @@ class Group(models.Model):
         """
         Sum of all AIQuestions for all documents in this group
         """
+        if hasattr(self, '_questions_count'):
+            return self._questions_count
         return self.ai_questions.count()
 
 
@@ -136,6 +179,36 @@ class GroupMember(models.Model):
         return f"{self.user} -> {self.group}"
 
 
+# =======================
+# DOCUMENT BLOB
+# =======================
+def blob_upload_to(instance, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return f"document_blobs/{instance.sha256[:2]}/{instance.sha256}{extension}"
+
+
+class DocumentBlob(models.Model):
+    """
+    One stored file per distinct upload (keyed by SHA-256), shared by every
+    Document with the same content, together with its extraction result
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=blob_upload_to)
+    size = models.PositiveBigIntegerField(default=0)  # bytes
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    # Extraction result (see pramiti_ai.DocumentPage / DocumentChunk)
+    page_count = models.PositiveIntegerField(default=0)
+    text_length = models.PositiveIntegerField(default=0)
+    text_hash = models.CharField(max_length=64, blank=True)
+    extracted_at = models.DateTimeField(null=True, blank=True)
+    # Rendered page previews (0 = not rendered yet), see pramiti_ai.utils.previews
+    preview_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.sha256
+
+
 # =======================
 # DOCUMENT
 # =======================
@@ -149,6 +222,13 @@ class Document(models.Model):
     summary = models.TextField(blank=True)
     file = models.FileField(upload_to='group_documents/')
     file_size = models.CharField(max_length=50, blank=True)
+    blob = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='documents'
+    )
     uploaded_by = models.ForeignKey(
         "accounts.Organization",
         on_delete=models.SET_NULL,
@@ -157,7 +237,23 @@ class Document(models.Model):
         related_name="documents_uploaded"
     )
     uploaded_on = models.DateTimeField(auto_now_add=True)
-    content = models.TextField(blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True)
+    page_count = models.PositiveIntegerField(default=0)
+    text_length = models.PositiveIntegerField(default=0)  # characters of extracted text (copied from the blob)
+
+    EXTRACTION_STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    extraction_status = models.CharField(
+        max_length=20,
+        choices=EXTRACTION_STATUS_CHOICES,
+        default='pending'
+    )
+    extraction_started_at = models.DateTimeField(null=True, blank=True)
+    extraction_ms = models.PositiveIntegerField(null=True, blank=True)  # time spent parsing the file
     views = models.PositiveIntegerField(default=0)
     readers = models.PositiveIntegerField(default=0)
     unanswered_questions = models.PositiveIntegerField(default=0)
@@ -181,11 +277,8 @@ class Document(models.Model):
 
     @property
     def avg_read_time(self):
-        qs = self.read_statuses.all()
-        if not qs.exists():
-            return 0
-        total_seconds = sum(r.read_time_seconds for r in qs)
-        return total_seconds / qs.count()  # average in seconds (float)
+        average = self.read_statuses.aggregate(avg=models.Avg('read_time_seconds'))['avg']
+        return average or 0  # average in seconds (float)
 
 
     @property
@@ -203,6 +296,40 @@ class Document(models.Model):
         return (completed_users * 100) // total_users
 
 
+# =======================
+# STATS (denormalized counters, see groups/utils/stats.py)
+# =======================
+class GroupStats(models.Model):
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    members_count = models.PositiveIntegerField(default=0)  # active members
+    documents_count = models.PositiveIntegerField(default=0)
+    questions_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats for {self.group}"
+
+
+class DocumentStats(models.Model):
+    document = models.OneToOneField(
+        Document,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    questions_count = models.PositiveIntegerField(default=0)
+    readers_count = models.PositiveIntegerField(default=0)  # read statuses with read time > 0
+    completed_count = models.PositiveIntegerField(default=0)
+    total_read_seconds = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats for {self.document}"
+
+
 class DocumentReadStatus(models.Model):
     document = models.ForeignKey(
         Document,
@@ -220,6 +347,10 @@ class DocumentReadStatus(models.Model):
 
     class Meta:
         unique_together = ('document', 'user')
+        indexes = [
+            # ordered scans for read-time percentiles
+            models.Index(fields=['document', 'read_time_seconds']),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.document.title}"
@@ -231,22 +362,53 @@ class DocumentReadStatus(models.Model):
 # models.py
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.utils import timezone
 from groups.models import Group, Document
 
 class ActivityLog(models.Model):
+    # Generic actor reference, still written for older readers; queries
+    # use the typed actor_user / actor_org columns below
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
-    user = GenericForeignKey('content_type', 'object_id')
+
+    actor_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="activity_logs"
+    )
+    actor_org = models.ForeignKey(
+        "accounts.Organization",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="activity_logs"
+    )
 
     group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True)
     document = models.ForeignKey(Document, on_delete=models.CASCADE, null=True, blank=True)
     action = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # set when the event is queued, not when the buffer writes it (groups/utils/activity.py)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # a document's activity feed, newest first
+            models.Index(fields=['document', 'timestamp']),
+        ]
 
     def __str__(self):
         return self.action
 
+    @property
+    def user(self):
+        """
+        The User or Organization that acted (select_related both actor_*
+        columns to load a feed in one query)
+        """
+        return self.actor_user or self.actor_org
+
 # notifications/models.py
 from django.db import models
 from django.conf import settings
@@ -273,5 +435,28 @@ class Notification(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of a user's notifications, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_keyset_idx'),
+        ]
+
     def __str__(self):
         return f"{self.type} - {self.message[:50]}"
+
+
+class NotificationCounter(models.Model):
+    """
+    Per-user unread notification count, kept in step by the helpers in
+    groups/utils/utils.py (create, bulk fan-out, mark read, cascades)
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="notification_counter"
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} - {self.unread_count} unread"
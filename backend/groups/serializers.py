@@ -1,3 +1,5 @@
+from django.urls import reverse
+from pramiti_ai.utils.previews import THUMBNAIL_NAME, page_preview_name
 from rest_framework import serializers
 from .models import Group
 from rest_framework import serializers
@@ -87,7 +89,8 @@ class ActivityLogSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ActivityLog
-        fields = "__all__"
+        # the actor_* columns are internal; `user` already carries the actor
+        fields = ["id", "user", "content_type", "object_id", "group", "document", "action", "timestamp"]
 
 from rest_framework import generics, permissions
 from .models import Group, GroupMember
@@ -115,18 +118,30 @@ from .models import Group, GroupMember
 
 class UserGroupSerializer(serializers.ModelSerializer):
     membership_status = serializers.SerializerMethodField()
+    role = serializers.SerializerMethodField()
     
     class Meta:
         model = Group
-        fields = ['id', 'name', 'description', 'code', 'membership_status','status']  # add other fields as needed
+        fields = ['id', 'name', 'description', 'code', 'membership_status','status', 'role']  # add other fields as needed
+
+    def _membership(self, obj):
+        """
+        The request user's membership, from context["memberships"] (group id ->
+        GroupMember) when the view already loaded them
+        """
+        memberships = self.context.get('memberships')
+        if memberships is not None:
+            return memberships.get(obj.id)
+        user = self.context['request'].user
+        return GroupMember.objects.filter(user=user, group=obj).first()
 
     def get_membership_status(self, obj):
-        user = self.context['request'].user
-        try:
-            member = GroupMember.objects.get(user=user, group=obj)
-            return member.status  # 'pending', 'active', etc.
-        except GroupMember.DoesNotExist:
-            return None
+        member = self._membership(obj)
+        return member.status if member else None  # 'pending', 'active', etc.
+
+    def get_role(self, obj):
+        member = self._membership(obj)
+        return member.role if member else None
 
 class OrganizationMemberSerializer(serializers.ModelSerializer):
     groups = serializers.SerializerMethodField()
@@ -188,9 +203,13 @@ class DocumentSerializer(serializers.ModelSerializer):
 
     # Read-only URL field
     file_url = serializers.SerializerMethodField(read_only=True)
+    download_url = serializers.SerializerMethodField(read_only=True)
+    thumbnail_url = serializers.SerializerMethodField(read_only=True)
+    preview_urls = serializers.SerializerMethodField(read_only=True)
 
-    not_completed_count = serializers.IntegerField(read_only=True)
-    completed_count = serializers.IntegerField(read_only=True)
+    not_completed_count = serializers.SerializerMethodField(read_only=True)
+    completed_count = serializers.SerializerMethodField(read_only=True)
+    completion_percent = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Document
@@ -200,6 +219,9 @@ class DocumentSerializer(serializers.ModelSerializer):
             "summary",
             "file",          # for upload
             "file_url",      # for response
+            "download_url",  # authenticated, supports Range requests
+            "thumbnail_url",
+            "preview_urls",  # low-resolution images of the first pages
             "uploaded_on",
             "uploaded_by",
             "uploaded_by_name",
@@ -209,6 +231,7 @@ class DocumentSerializer(serializers.ModelSerializer):
             "not_completed_count",
             "completion_percent",
             "completed_count",
+            "extraction_status",
         ]
         read_only_fields = [
             "id",
@@ -216,6 +239,7 @@ class DocumentSerializer(serializers.ModelSerializer):
             "uploaded_by",
             "uploaded_by_name",
             "file_size",
+            "extraction_status",
         ]
 
     def get_file_url(self, obj):
@@ -224,6 +248,50 @@ class DocumentSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.file.url) if request else obj.file.url
         return None
 
+    def _completion(self, obj):
+        """
+        (completed readers, active members), from the list view's context
+        when available (see group_completion_metrics)
+        """
+        completed_counts = self.context.get("completed_counts")
+        if completed_counts is None:
+            return obj.completed_count, obj.total_users
+        return completed_counts.get(obj.id, 0), self.context["active_members_count"]
+
+    def get_completed_count(self, obj):
+        return self._completion(obj)[0]
+
+    def get_not_completed_count(self, obj):
+        completed, total = self._completion(obj)
+        return total - completed
+
+    def get_completion_percent(self, obj):
+        completed, total = self._completion(obj)
+        return (completed * 100) // total if total else 0
+
+    def get_download_url(self, obj):
+        request = self.context.get("request")
+        url = reverse("document-download", args=[obj.id])
+        return request.build_absolute_uri(url) if request else url
+
+    def _preview_url(self, obj, name):
+        request = self.context.get("request")
+        url = reverse("document-preview", args=[obj.id, name])
+        return request.build_absolute_uri(url) if request else url
+
+    def get_thumbnail_url(self, obj):
+        if not obj.blob_id or not obj.blob.preview_count:
+            return None
+        return self._preview_url(obj, THUMBNAIL_NAME)
+
+    def get_preview_urls(self, obj):
+        if not obj.blob_id:
+            return []
+        return [
+            self._preview_url(obj, page_preview_name(number))
+            for number in range(1, obj.blob.preview_count + 1)
+        ]
+
 
 from rest_framework import serializers
 from .models import DocumentReadStatus
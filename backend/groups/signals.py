@@ -0,0 +1,110 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Group, GroupMember, Document, DocumentReadStatus, GroupStats, DocumentStats, Notification
+from .utils.stats import bump_group_stats, bump_document_stats
+from .utils.utils import forget_unread
+
+
+# ---------------------------
+# Stats rows for new groups / documents
+# ---------------------------
+@receiver(post_save, sender=Group)
+def create_group_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(post_save, sender=Document)
+def document_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        DocumentStats.objects.get_or_create(document=instance)
+        bump_group_stats(instance.group_id, documents_count=1)
+
+
+@receiver(pre_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    # Its questions go with it (cascade); take them off the group in one step
+    questions = DocumentStats.objects.filter(document=instance).values_list("questions_count", flat=True).first()
+    if questions is None:
+        questions = instance.ai_questions.count()
+    bump_group_stats(instance.group_id, create_missing=False, documents_count=-1, questions_count=-questions)
+
+
+# ---------------------------
+# Members (only active members are counted)
+# ---------------------------
+@receiver(post_init, sender=GroupMember)
+def remember_member_status(sender, instance, **kwargs):
+    instance._stats_status = instance.status
+
+
+@receiver(post_save, sender=GroupMember)
+def member_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    was_active = not created and instance._stats_status == "active"
+    bump_group_stats(instance.group_id, members_count=int(instance.status == "active") - int(was_active))
+    instance._stats_status = instance.status
+
+
+@receiver(post_delete, sender=GroupMember)
+def member_deleted(sender, instance, **kwargs):
+    if instance._stats_status == "active":
+        bump_group_stats(instance.group_id, create_missing=False, members_count=-1)
+
+
+# ---------------------------
+# AI questions (bulk_create callers bump the stats themselves)
+# ---------------------------
+@receiver(post_save, sender="pramiti_ai.AIQuestion")
+def question_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_group_stats(instance.group_id, questions_count=1)
+        bump_document_stats(instance.document_id, questions_count=1)
+
+
+# ---------------------------
+# Read statuses
+# ---------------------------
+@receiver(post_init, sender=DocumentReadStatus)
+def remember_read_status(sender, instance, **kwargs):
+    instance._stats_state = (instance.read_time_seconds, instance.is_completed)
+
+
+def _read_deltas(old, new):
+    (old_seconds, old_completed), (new_seconds, new_completed) = old, new
+    return {
+        "readers_count": int(new_seconds > 0) - int(old_seconds > 0),
+        "completed_count": int(new_completed) - int(old_completed),
+        "total_read_seconds": new_seconds - old_seconds,
+    }
+
+
+@receiver(post_save, sender=DocumentReadStatus)
+def read_status_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = (0, False) if created else instance._stats_state
+    new = (instance.read_time_seconds, instance.is_completed)
+    bump_document_stats(instance.document_id, **_read_deltas(old, new))
+    instance._stats_state = new
+
+
+@receiver(post_delete, sender=DocumentReadStatus)
+def read_status_deleted(sender, instance, **kwargs):
+    bump_document_stats(instance.document_id, create_missing=False, **_read_deltas(instance._stats_state, (0, False)))
+
+
+# ---------------------------
+# Unread notification counters: notifications are cascade-deleted with
+# their document (or, without one, their group)
+# ---------------------------
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    forget_unread(Notification.objects.filter(group=instance, document__isnull=True))
+
+
+@receiver(pre_delete, sender=Document)
+def document_notifications_deleted(sender, instance, **kwargs):
+    forget_unread(Notification.objects.filter(document=instance))
@@ -1,3 +1,724 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import mock
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Organization, User
+from pramiti_ai.models import AIQuestion
+from pramiti_ai.utils.previews import preview_path
+from .models import (
+    ActivityLog, Group, GroupMember, Document, DocumentBlob, DocumentReadStatus, GroupStats, DocumentStats, Notification, NotificationCounter,
+)
+from .consumers import notifications_websocket
+from .serializers import DocumentSerializer
+from .utils import activity, realtime
+from .utils.downloads import parse_range
+from .utils.stats import rebuild_group_stats, rebuild_document_stats
+from .utils.utils import notify_group_members, create_notification, get_unread_count, log_activity
+
+
+class GroupCountsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create_user(
+            email="org@example.com",
+            password="secret",
+            admin_name="Admin",
+            designation="HR",
+            phone_number="1",
+            organization_name="Acme",
+            industry="IT",
+            organization_size=10,
+            registration_id="R1",
+        )
+        cls.users = [User.objects.create_user(f"user{i}@example.com", "secret") for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.org)
+
+    def make_groups(self, count):
+        for _ in range(count):
+            group = Group.objects.create(name="Group", organization=self.org)
+            GroupMember.objects.create(group=group, user=self.users[0], status="active")
+            GroupMember.objects.create(group=group, user=self.users[1], status="active")
+            GroupMember.objects.create(group=group, user=self.users[2], status="pending")
+            for _ in range(2):
+                document = Document.objects.create(group=group, title="Doc", file="group_documents/doc.pdf")
+            AIQuestion.objects.create(user=self.users[0], group=group, document=document, question="Why?")
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/groups/")
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_group_list_query_count_is_constant(self):
+        self.make_groups(2)
+        few, _ = self.count_list_queries()
+
+        self.make_groups(10)
+        many, data = self.count_list_queries()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(data), 12)
+
+    def test_group_list_counts(self):
+        self.make_groups(1)
+        _, data = self.count_list_queries()
+
+        self.assertEqual(data[0]["members_count"], 2)
+        self.assertEqual(data[0]["documents_count"], 2)
+        self.assertEqual(data[0]["questions_count"], 1)
+
+    def test_group_detail_counts(self):
+        self.make_groups(1)
+        group = Group.objects.get()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/groups/{group.id}/")
+
+        self.assertEqual(response.data["members_count"], 2)
+        self.assertEqual(response.data["documents_count"], 2)
+        self.assertEqual(response.data["questions_count"], 1)
+
+    def test_counts_without_annotation_fall_back_to_queries(self):
+        self.make_groups(1)
+        group = Group.objects.get()
+
+        self.assertEqual(group.members_count, 2)
+        self.assertEqual(group.documents_count, 2)
+        self.assertEqual(group.questions_count, 1)
+
+
+class GroupDocumentsListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create_user(
+            email="org@example.com",
+            password="secret",
+            admin_name="Admin",
+            designation="HR",
+            phone_number="1",
+            organization_name="Acme",
+            industry="IT",
+            organization_size=10,
+            registration_id="R1",
+        )
+        cls.users = [User.objects.create_user(f"user{i}@example.com", "secret") for i in range(4)]
+        cls.group = Group.objects.create(name="Group", organization=cls.org)
+        for user in cls.users[:3]:
+            GroupMember.objects.create(group=cls.group, user=user, status="active")
+        GroupMember.objects.create(group=cls.group, user=cls.users[3], status="pending")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.org)
+
+    def make_documents(self, count):
+        for _ in range(count):
+            document = Document.objects.create(group=self.group, title="Doc", file="group_documents/doc.pdf", uploaded_by=self.org)
+            for user in self.users[:2]:
+                DocumentReadStatus.objects.create(document=document, user=user, is_completed=user == self.users[0])
+
+    def get_documents(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/groups/{self.group.id}/documents/")
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data
+
+    def test_query_count_is_constant(self):
+        self.make_documents(2)
+        few, _ = self.get_documents()
+
+        self.make_documents(8)
+        many, data = self.get_documents()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(data), 10)
+
+    def test_completion_metrics(self):
+        self.make_documents(1)
+        _, data = self.get_documents()
+
+        self.assertEqual(data[0]["completed_count"], 1)
+        self.assertEqual(data[0]["not_completed_count"], 2)
+        self.assertEqual(data[0]["completion_percent"], 33)
+
+        response = self.client.get(f"/api/documents/{data[0]['id']}/")
+        self.assertEqual(response.data["completion_percent"], 33)
+
+
+class UserGroupsListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("member@example.com", "secret")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def join_groups(self, count, role="member", status="active"):
+        for _ in range(count):
+            group = Group.objects.create(name="Group")
+            GroupMember.objects.create(group=group, user=self.user, role=role, status=status)
+
+    def test_query_count_is_constant(self):
+        self.join_groups(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get("/api/user/groups/")
+
+        self.join_groups(10, status="pending")
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get("/api/user/groups/")
+
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(response.data), 12)
+
+    def test_role_and_status(self):
+        self.join_groups(1, role="admin", status="pending")
+        other = Group.objects.create(name="Other")
+        GroupMember.objects.create(group=other, user=User.objects.create_user("x@example.com", "secret"), status="active")
+
+        response = self.client.get("/api/user/groups/")
+
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["role"], "admin")
+        self.assertEqual(response.data[0]["membership_status"], "pending")
+
+
+class StatsCountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create_user(
+            email="org@example.com",
+            password="secret",
+            admin_name="Admin",
+            designation="HR",
+            phone_number="1",
+            organization_name="Acme",
+            industry="IT",
+            organization_size=10,
+            registration_id="R1",
+        )
+        cls.user = User.objects.create_user("reader@example.com", "secret")
+
+    def setUp(self):
+        self.group = Group.objects.create(name="Group", organization=self.org)
+        self.document = Document.objects.create(group=self.group, title="Doc", file="group_documents/doc.pdf")
+
+    def group_stats(self):
+        return GroupStats.objects.get(group=self.group)
+
+    def document_stats(self):
+        return DocumentStats.objects.get(document=self.document)
+
+    def test_member_status_changes(self):
+        member = GroupMember.objects.create(group=self.group, user=self.user, status="pending")
+        self.assertEqual(self.group_stats().members_count, 0)
+
+        member.status = "active"
+        member.save()
+        member.save()
+        self.assertEqual(self.group_stats().members_count, 1)
+
+        member = GroupMember.objects.get(id=member.id)
+        member.status = "suspended"
+        member.save()
+        self.assertEqual(self.group_stats().members_count, 0)
+
+    def test_questions_and_document_delete(self):
+        AIQuestion.objects.create(user=self.user, group=self.group, document=self.document, question="Why?")
+        AIQuestion.objects.create(user=self.user, group=self.group, document=self.document, question="How?")
+        self.assertEqual(self.group_stats().documents_count, 1)
+        self.assertEqual(self.group_stats().questions_count, 2)
+        self.assertEqual(self.document_stats().questions_count, 2)
+
+        self.document.delete()
+        self.assertEqual(self.group_stats().documents_count, 0)
+        self.assertEqual(self.group_stats().questions_count, 0)
+
+    def test_read_status_updates(self):
+        status, _ = DocumentReadStatus.objects.get_or_create(document=self.document, user=self.user)
+        self.assertEqual(self.document_stats().readers_count, 0)
+
+        status.read_time_seconds += 30
+        status.save()
+        status = DocumentReadStatus.objects.get(id=status.id)
+        status.read_time_seconds += 15
+        status.is_completed = True
+        status.save()
+
+        stats = self.document_stats()
+        self.assertEqual(stats.readers_count, 1)
+        self.assertEqual(stats.completed_count, 1)
+        self.assertEqual(stats.total_read_seconds, 45)
+
+    def test_missing_rows_are_rebuilt_and_drift_repaired(self):
+        GroupMember.objects.create(group=self.group, user=self.user, status="active")
+        GroupStats.objects.all().delete()
+        DocumentStats.objects.update(questions_count=99)
+
+        AIQuestion.objects.create(user=self.user, group=self.group, document=self.document, question="Why?")
+        self.assertEqual(self.group_stats().members_count, 1)
+        self.assertEqual(self.group_stats().questions_count, 1)
+
+        rebuild_group_stats()
+        rebuild_document_stats()
+        self.assertEqual(self.document_stats().questions_count, 1)
+
+
+class ReadTimeStatsTests(TestCase):
+    def test_percentiles_and_histogram(self):
+        org = Organization.objects.create_user(
+            email="org@example.com",
+            password="secret",
+            admin_name="Admin",
+            designation="HR",
+            phone_number="1",
+            organization_name="Acme",
+            industry="IT",
+            organization_size=10,
+            registration_id="R1",
+        )
+        group = Group.objects.create(name="Group", organization=org)
+        document = Document.objects.create(group=group, title="Doc", file="group_documents/doc.pdf")
+        for i, seconds in enumerate([10, 20, 40, 100, 4000]):
+            user = User.objects.create_user(f"user{i}@example.com", "secret")
+            DocumentReadStatus.objects.create(document=document, user=user, read_time_seconds=seconds)
+
+        response = APIClient().get(f"/api/documents/{document.id}/read-time-stats/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(response.data["avg_seconds"], 834)
+        self.assertEqual(response.data["median_seconds"], 40)
+        self.assertAlmostEqual(response.data["p90_seconds"], 100 + (4000 - 100) * 0.6)
+        self.assertEqual([b["count"] for b in response.data["histogram"]], [2, 1, 1, 0, 0, 0, 0, 1])
+        self.assertEqual(document.avg_read_time, 834)
+
+
+class NotificationFanOutTests(TestCase):
+    @override_settings(NOTIFICATION_BATCH_SIZE=2)
+    def test_batches_and_member_status(self):
+        group = Group.objects.create(name="Group")
+        for i in range(5):
+            user = User.objects.create_user(f"user{i}@example.com", "secret")
+            GroupMember.objects.create(group=group, user=user, status="active" if i else "pending")
+            get_unread_count(user)
+
+        # active members only: 4 rows in 2 INSERTs (each followed by one
+        # counter UPDATE), plus the member id query
+        with self.assertNumQueries(5):
+            created = notify_group_members(group.id, "added", "Hello", member_status="active")
+
+        self.assertEqual(created, 4)
+        self.assertEqual(Notification.objects.filter(group=group, type="added").count(), 4)
+        self.assertEqual(NotificationCounter.objects.filter(unread_count=1).count(), 4)
+
+
+class NotificationListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader@example.com", "secret")
+        self.group = Group.objects.create(name="Group")
+        GroupMember.objects.create(group=self.group, user=self.user, status="active")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def unread(self):
+        return NotificationCounter.objects.get(user=self.user).unread_count
+
+    def test_cursor_pages_cover_every_notification_once(self):
+        for i in range(5):
+            create_notification(self.user, "added", f"Hello {i}", group=self.group)
+
+        response = self.client.get("/api/notifications/user/?limit=2")
+        seen = [n["id"] for n in response.data["notifications"]]
+        # a notification arriving between pages does not shift the next ones
+        create_notification(self.user, "added", "Late", group=self.group)
+        while response.data["next_cursor"]:
+            response = self.client.get(f"/api/notifications/user/?limit=2&cursor={response.data['next_cursor']}")
+            seen += [n["id"] for n in response.data["notifications"]]
+
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(response.data["unread_count"], 6)
+        self.assertEqual(self.client.get("/api/notifications/user/?cursor=bogus").status_code, 400)
+
+    def test_unread_counter_is_maintained(self):
+        notification = create_notification(self.user, "added", "Hello", group=self.group)
+        notify_group_members(self.group.id, "added", "Hi all")
+        self.assertEqual(self.unread(), 2)
+
+        self.client.post(f"/api/notifications/read/{notification.id}/")
+        self.client.post(f"/api/notifications/read/{notification.id}/")
+        self.assertEqual(self.unread(), 1)
+
+        document = Document.objects.create(group=self.group, title="Doc", file="group_documents/doc.pdf")
+        create_notification(self.user, "document_uploaded", "New", group=self.group, document=document)
+        self.assertEqual(self.unread(), 2)
+        document.delete()
+        self.assertEqual(self.unread(), 1)
+        self.group.delete()
+        self.assertEqual(self.unread(), 0)
+
+    def test_counter_is_created_for_existing_notifications(self):
+        Notification.objects.create(user=self.user, type="added", message="Old")
+        self.assertEqual(get_unread_count(self.user), 1)
+
+    def test_bulk_mark_read(self):
+        notifications = [create_notification(self.user, "added", f"Hello {i}", group=self.group) for i in range(6)]
+        listed = self.client.get("/api/notifications/user/").data["notifications"]
+
+        with self.assertNumQueries(3):  # notifications UPDATE, counter UPDATE, counter read
+            response = self.client.post(
+                "/api/notifications/read/", {"ids": [notifications[0].id, notifications[1].id]}, format="json"
+            )
+        self.assertEqual(response.data, {"marked": 2, "unread_count": 4})
+
+        # listed newest first: the third item and everything older
+        response = self.client.post("/api/notifications/read/", {"cursor": listed[2]["cursor"]}, format="json")
+        self.assertEqual(response.data, {"marked": 2, "unread_count": 2})
+
+        response = self.client.post("/api/notifications/read/", {"all": True}, format="json")
+        self.assertEqual(response.data, {"marked": 2, "unread_count": 0})
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(Notification.objects.filter(read=False).exists())
+
+        response = self.client.post("/api/notifications/read/", {"all": True, "ids": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+        for ids in ([True], ["1"], [1.0]):
+            response = self.client.post("/api/notifications/read/", {"ids": ids}, format="json")
+            self.assertEqual(response.status_code, 400)
+
+
+@override_settings(NOTIFICATION_BROKER_POLL_SECONDS=0.05, NOTIFICATION_AUTH_TIMEOUT_SECONDS=5)
+class NotificationPushTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader@example.com", "secret")
+        self.user.is_active = True
+        self.user.save()
+        refresh = RefreshToken.for_user(self.user)
+        refresh["user_type"] = "user"
+        self.token = str(refresh.access_token)
+
+    async def connect(self, token=None, query_string=b""):
+        incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+        await incoming.put({"type": "websocket.connect"})
+        if token is not None:
+            await incoming.put({"type": "websocket.receive", "text": json.dumps({"type": "auth", "token": token})})
+        scope = {"type": "websocket", "path": "/ws/notifications/", "query_string": query_string}
+        task = asyncio.create_task(notifications_websocket(scope, incoming.get, outgoing.put))
+        self.assertEqual((await asyncio.wait_for(outgoing.get(), 5))["type"], "websocket.accept")
+        return incoming, outgoing, task
+
+    async def receive_json(self, outgoing):
+        message = await asyncio.wait_for(outgoing.get(), 5)
+        return json.loads(message["text"])
+
+    def receive_new_notification(self):
+        Notification.objects.create(user=self.user, type="added", message="Old")
+
+        async def scenario():
+            incoming, outgoing, task = await self.connect(self.token)
+            self.assertEqual(await self.receive_json(outgoing), {"type": "unread_count", "unread_count": 1})
+
+            await asyncio.to_thread(create_notification, self.user, "added", "Hello")
+            message = await self.receive_json(outgoing)
+
+            await incoming.put({"type": "websocket.disconnect"})
+            await asyncio.wait_for(task, 5)
+            return message
+
+        message = async_to_sync(scenario)()
+        self.assertEqual(message["type"], "notification")
+        self.assertEqual(message["notification"]["message"], "Hello")
+
+    def test_websocket_receives_new_notifications(self):
+        self.receive_new_notification()
+
+    @override_settings(NOTIFICATION_BROKER_BACKEND="groups.utils.realtime.InProcessBroker")
+    def test_websocket_with_the_in_process_broker(self):
+        self.receive_new_notification()
+
+    def test_database_broker_delivers_each_new_row_once(self):
+        broker = realtime.DatabaseBroker()
+        Notification.objects.create(user=self.user, type="added", message="Before")
+
+        async def scenario():
+            with mock.patch.object(broker, "_ensure_poller"):
+                async with broker.subscribe(self.user.id) as queue:
+                    await asyncio.to_thread(create_notification, self.user, "added", "After")
+                    await asyncio.to_thread(broker.poll)
+                    await asyncio.to_thread(broker.poll)
+                    await asyncio.sleep(0)
+                    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+        messages = async_to_sync(scenario)()
+        self.assertEqual([m["notification"]["message"] for m in messages], ["After"])
+
+    def closed_with(self, outgoing):
+        message = outgoing.get_nowait()
+        return message["type"], message.get("code")
+
+    def test_websocket_rejects_bad_token(self):
+        async def scenario():
+            _, outgoing, task = await self.connect("bogus")
+            await asyncio.wait_for(task, 5)
+            return self.closed_with(outgoing)
+
+        self.assertEqual(async_to_sync(scenario)(), ("websocket.close", 4401))
+
+    @override_settings(NOTIFICATION_AUTH_TIMEOUT_SECONDS=0.1)
+    def test_websocket_requires_an_auth_message(self):
+        async def scenario():
+            # a token in the URL is not accepted
+            _, outgoing, task = await self.connect(query_string=f"token={self.token}".encode())
+            await asyncio.wait_for(task, 5)
+            return self.closed_with(outgoing)
+
+        self.assertEqual(async_to_sync(scenario)(), ("websocket.close", 4401))
+
+    def test_stream_takes_the_token_from_the_header_only(self):
+        response = self.client.get(f"/api/notifications/stream/?token={self.token}")
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(
+    ACTIVITY_LOG_BATCH_SIZE=3,
+    ACTIVITY_LOG_FLUSH_SECONDS=3600,
+    ACTIVITY_LOG_SPOOL_PATH=os.path.join(tempfile.mkdtemp(), "spool.jsonl"),
+)
+class ActivityBufferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader@example.com", "secret")
+        self.group = Group.objects.create(name="Group")
+        self.document = Document.objects.create(group=self.group, title="Doc", file="group_documents/doc.pdf")
+        self.buffer = activity.ActivityBuffer()
+        self.addCleanup(self.buffer.flush)
+
+    def entry(self, document=None):
+        return {
+            "content_type_id": activity.content_type_id(User),
+            "object_id": self.user.id,
+            "actor_user_id": self.user.id,
+            "actor_org_id": None,
+            "group_id": self.group.id,
+            "document_id": (document or self.document).id,
+            "action": "viewed",
+            "timestamp": timezone.now(),
+        }
+
+    def test_rows_wait_for_a_flush_and_keep_their_time(self):
+        entry = self.entry()
+        self.buffer.add(entry)
+        self.buffer.add(self.entry())
+        self.assertFalse(ActivityLog.objects.exists())
+
+        with self.assertNumQueries(4):  # group, document and actor existence, one INSERT
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(ActivityLog.objects.order_by("id").first().timestamp, entry["timestamp"])
+
+    def test_log_activity_resolves_content_type_once(self):
+        activity.content_type_id(User)
+        with self.assertNumQueries(0):
+            log_activity(user=self.user, group=self.group, document=self.document, action="viewed")
+        self.assertEqual(activity.flush_activity(), 1)
+        self.assertEqual(ActivityLog.objects.get().user, self.user)
+
+    def test_failed_writes_are_spooled_and_replayed(self):
+        other = Document.objects.create(group=self.group, title="Gone", file="group_documents/doc.pdf")
+        self.buffer.add(self.entry())
+        self.buffer.add(self.entry(other))
+        with mock.patch.object(ActivityLog.objects, "bulk_create", side_effect=DatabaseError), self.assertLogs(activity.logger):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertFalse(ActivityLog.objects.exists())
+
+        other.delete()
+        self.assertEqual(activity.replay_spool(), (1, 0))
+        self.assertEqual(ActivityLog.objects.get().document, self.document)
+        self.assertEqual(activity.replay_spool(), (0, 0))
+
+    def test_deleted_actors_are_nulled(self):
+        self.buffer.add(self.entry())
+        self.user.delete()
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertIsNone(ActivityLog.objects.get().actor_user)
+
+    def test_replay_picks_up_an_interrupted_replay(self):
+        activity.spool_entries([self.entry()])
+        # a replay that died after taking the spool over
+        os.replace(settings.ACTIVITY_LOG_SPOOL_PATH, f"{settings.ACTIVITY_LOG_SPOOL_PATH}.replaying")
+        activity.spool_entries([self.entry()])
+
+        self.assertEqual(activity.replay_spool(), (2, 0))
+        self.assertEqual(ActivityLog.objects.count(), 2)
+        self.assertEqual(activity.replay_spool(), (0, 0))
+
+    def test_replay_writes_all_rows_or_none(self):
+        activity.spool_entries([self.entry(), self.entry()])
+
+        def first_batch_then_fail(entries):
+            ActivityLog.objects.create(**entries[0])
+            raise DatabaseError
+
+        with mock.patch.object(activity, "write_entries", side_effect=first_batch_then_fail), \
+                self.assertLogs(activity.logger):
+            self.assertEqual(activity.replay_spool(), (0, 2))
+        self.assertFalse(ActivityLog.objects.exists())
+        self.assertEqual(activity.replay_spool(), (2, 0))
+
+
+class DocumentDownloadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, DOCUMENT_SENDFILE_BACKEND=""))
+
+        self.user = User.objects.create_user("reader@example.com", "secret")
+        group = Group.objects.create(name="Group")
+        GroupMember.objects.create(group=group, user=self.user, status="active")
+        name = default_storage.save("group_documents/doc.pdf", ContentFile(b"0123456789"))
+        self.document = Document.objects.create(group=group, title="Doc", file=name)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, headers=None):
+        response = self.client.get(f"/api/documents/{self.document.id}/download/", headers=headers)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.download()
+        self.assertEqual((response.status_code, body), (200, b"0123456789"))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Disposition"], 'inline; filename="Doc.pdf"')
+        self.assertTrue(response["ETag"].startswith('"'))
+
+    def test_ranges(self):
+        response, body = self.download({"Range": "bytes=2-5"})
+        self.assertEqual((response.status_code, body), (206, b"2345"))
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+
+        response, body = self.download({"Range": "bytes=-3"})
+        self.assertEqual((response.status_code, body), (206, b"789"))
+
+        response, _ = self.download({"Range": "bytes=20-"})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_conditional_requests(self):
+        etag = self.download()[0]["ETag"]
+
+        response, body = self.download({"If-None-Match": f'"stale", {etag}'})
+        self.assertEqual((response.status_code, body), (304, b""))
+
+        # a changed file ignores the range and sends it all
+        response, body = self.download({"Range": "bytes=2-5", "If-Range": '"stale"'})
+        self.assertEqual((response.status_code, body), (200, b"0123456789"))
+        response, _ = self.download({"Range": "bytes=2-5", "If-Range": etag})
+        self.assertEqual(response.status_code, 206)
+
+    def test_non_members_are_refused(self):
+        self.client.force_authenticate(User.objects.create_user("other@example.com", "secret"))
+        self.assertEqual(self.download()[0].status_code, 403)
+
+    def test_parse_range(self):
+        self.assertIsNone(parse_range(None, 10))
+        self.assertIsNone(parse_range("bytes=1-2,4-5", 10))
+        self.assertEqual(parse_range("bytes=8-", 10), (8, 9))
+        self.assertEqual(parse_range("bytes=5-100", 10), (5, 9))
+        self.assertEqual(parse_range("bytes=-20", 10), (0, 9))
+        for header in ("bytes=-0", "bytes=10-", "bytes=6-5"):
+            with self.assertRaises(ValueError):
+                parse_range(header, 10)
+
+
+class DocumentPreviewTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+        self.user = User.objects.create_user("reader@example.com", "secret")
+        group = Group.objects.create(name="Group")
+        GroupMember.objects.create(group=group, user=self.user, status="active")
+        blob = DocumentBlob.objects.create(sha256="a" * 64, file="document_blobs/a.pdf", preview_count=1)
+        default_storage.save(preview_path(blob.sha256, "thumbnail"), ContentFile(b"image"))
+        self.document = Document.objects.create(group=group, title="Doc", file=blob.file.name, blob=blob)
+        self.url = f"/api/documents/{self.document.id}/previews/thumbnail.webp"
+        self.client = APIClient()
+
+    def test_serializer_links_to_the_document_scoped_url(self):
+        data = DocumentSerializer(self.document).data
+        self.assertEqual(data["thumbnail_url"], self.url)
+        self.assertEqual(data["preview_urls"], [f"/api/documents/{self.document.id}/previews/page-1.webp"])
+
+    def test_members_get_the_image_and_revalidate(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"image")
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertEqual(response["Cache-Control"], "private, max-age=86400")
+        response.close()
+
+        response = self.client.get(self.url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(f"/api/documents/{self.document.id}/previews/page-2.webp")
+        self.assertEqual(response.status_code, 404)
+
+    def test_others_are_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.force_authenticate(User.objects.create_user("other@example.com", "secret"))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class DocumentActivityTests(TestCase):
+    def test_feed_loads_actors_in_one_query(self):
+        org = Organization.objects.create_user(
+            email="org@example.com",
+            password="secret",
+            admin_name="Admin",
+            designation="HR",
+            phone_number="1",
+            organization_name="Acme",
+            industry="IT",
+            organization_size=10,
+            registration_id="R1",
+        )
+        group = Group.objects.create(name="Group", organization=org)
+        document = Document.objects.create(group=group, title="Doc", file="group_documents/doc.pdf")
+        with override_settings(ACTIVITY_LOG_BATCH_SIZE=1):
+            log_activity(user=org, group=group, document=document, action="uploaded")
+            for i in range(3):
+                user = User.objects.create_user(f"user{i}@example.com", "secret")
+                user.full_name = f"User {i}"
+                user.save()
+                log_activity(user=user, group=group, document=document, action="viewed")
+
+        client = APIClient()
+        client.force_authenticate(org)
+        with self.assertNumQueries(1):
+            response = client.get(f"/api/documents/{document.id}/activity/")
+
+        self.assertEqual([a["user"].get("full_name") for a in response.data], ["User 2", "User 1", "User 0", None])
+        # same shape as before the typed actor columns
+        self.assertEqual(
+            list(response.data[-1]),
+            ["id", "user", "content_type", "object_id", "group", "document", "action", "timestamp"],
+        )
+        self.assertEqual(response.data[-1]["object_id"], org.id)
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 urlpatterns = [
@@ -28,13 +28,22 @@ urlpatterns = [
 
     # Documents general
     path("documents/<int:pk>/", views.DocumentDetailAPI.as_view(), name="document-detail"),
+    path("documents/<int:doc_id>/download/", views.DocumentDownloadAPI.as_view(), name="document-download"),
+    re_path(
+        r"^documents/(?P<doc_id>[0-9]+)/previews/(?P<name>thumbnail|page-[0-9]+)\.webp$",
+        views.DocumentPreviewAPI.as_view(),
+        name="document-preview",
+    ),
     path('documents/<int:document_id>/read-status/', views.UpdateReadStatusAPI.as_view(), name='document-read-status'),
     path('documents/<int:document_id>/engagement/', views.DocumentEngagementView.as_view(), name='document-engagement'),
+    path('documents/<int:document_id>/read-time-stats/', views.DocumentReadTimeStatsView.as_view(), name='document-read-time-stats'),
     path("documents/<int:doc_id>/activity/", views.DocumentActivityAPI.as_view(), name="doc-activity"),
 
     # Notifications
     path("notifications/user/", views.UserNotificationsAPI.as_view(), name="user_notifications"),
     path("notifications/read/<int:notif_id>/", views.MarkNotificationReadAPI.as_view(), name="mark_notification_read"),
+    path("notifications/read/", views.MarkNotificationsReadAPI.as_view(), name="mark_notifications_read"),
+    path("notifications/stream/", views.notifications_stream, name="notifications_stream"),
 
     # Admin
     path("admin/dashboard/", views.AdminDashboardView.as_view(), name="admin-dashboard"),
@@ -0,0 +1,178 @@
+import atexit
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, transaction
+from django.utils.dateparse import parse_datetime
+
+from ..models import ActivityLog, Document, Group
+from .background import submit
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------
+# Content types of activity actors, resolved once per process
+# ---------------------------
+_content_type_ids = {}
+
+
+def content_type_id(model):
+    if model not in _content_type_ids:
+        from accounts.models import Organization, User
+
+        # both actor types in one query the first time either is needed
+        for actor_model, content_type in ContentType.objects.get_for_models(User, Organization, model).items():
+            _content_type_ids[actor_model] = content_type.id
+    return _content_type_ids[model]
+
+
+# ---------------------------
+# Write-behind buffer: rows are queued in memory and written with one
+# bulk_create once ACTIVITY_LOG_BATCH_SIZE are waiting or the oldest has
+# waited ACTIVITY_LOG_FLUSH_SECONDS. Rows that can't be written go to the
+# spool file (replayed by `manage.py flush_activity_log`).
+# ---------------------------
+class ActivityBuffer:
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pid = os.getpid()
+
+    def add(self, entry):
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked worker: the parent's rows and timer aren't ours
+                self._entries, self._timer, self._pid = [], None, os.getpid()
+            self._entries.append(entry)
+            full = len(self._entries) >= settings.ACTIVITY_LOG_BATCH_SIZE
+            if not full and self._timer is None:
+                self._timer = threading.Timer(settings.ACTIVITY_LOG_FLUSH_SECONDS, submit, args=(self.flush,))
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            submit(self.flush)
+
+    def flush(self):
+        """
+        Write everything queued so far, returns the number of rows written
+        """
+        with self._lock:
+            entries, self._entries = self._entries, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not entries:
+            return 0
+        return write_or_spool(entries)
+
+
+def _existing_ids(model, ids):
+    ids = {i for i in ids if i}
+    return set(model.objects.filter(id__in=ids).values_list("id", flat=True)) if ids else set()
+
+
+def _drop_orphans(entries):
+    """
+    Rows for groups/documents deleted since they were queued are dropped
+    (their logs were cascade-deleted with them); actors deleted since then
+    are nulled, as SET_NULL would have done to a written row
+    """
+    from accounts.models import Organization, User
+
+    group_ids = _existing_ids(Group, (e["group_id"] for e in entries))
+    document_ids = _existing_ids(Document, (e["document_id"] for e in entries))
+    user_ids = _existing_ids(User, (e.get("actor_user_id") for e in entries))
+    org_ids = _existing_ids(Organization, (e.get("actor_org_id") for e in entries))
+    return [
+        {
+            **e,
+            "actor_user_id": e.get("actor_user_id") if e.get("actor_user_id") in user_ids else None,
+            "actor_org_id": e.get("actor_org_id") if e.get("actor_org_id") in org_ids else None,
+        }
+        for e in entries
+        if (not e["group_id"] or e["group_id"] in group_ids)
+        and (not e["document_id"] or e["document_id"] in document_ids)
+    ]
+
+
+def write_entries(entries):
+    rows = [ActivityLog(**entry) for entry in _drop_orphans(entries)]
+    ActivityLog.objects.bulk_create(rows, batch_size=settings.ACTIVITY_LOG_BATCH_SIZE)
+    return len(rows)
+
+
+def write_or_spool(entries):
+    try:
+        return write_entries(entries)
+    except DatabaseError:
+        logger.exception("Could not write %d activity log rows, spooling them", len(entries))
+        spool_entries(entries)
+        return 0
+
+
+# ---------------------------
+# Spool file (JSON lines)
+# ---------------------------
+_spool_lock = threading.Lock()
+
+
+def spool_entries(entries):
+    with _spool_lock, open(settings.ACTIVITY_LOG_SPOOL_PATH, "a", encoding="utf-8") as spool:
+        for entry in entries:
+            spool.write(json.dumps({**entry, "timestamp": entry["timestamp"].isoformat()}) + "\n")
+        spool.flush()
+        os.fsync(spool.fileno())
+
+
+def replay_spool():
+    """
+    Write the spooled rows to the database, returns (written, still spooled).
+    Rows of a replay that died half way (a leftover .replaying file) go first.
+    """
+    path = settings.ACTIVITY_LOG_SPOOL_PATH
+    replaying = f"{path}.replaying"
+    with _spool_lock:
+        if os.path.exists(path):
+            if os.path.exists(replaying):
+                with open(path, encoding="utf-8") as spool, open(replaying, "a", encoding="utf-8") as leftover:
+                    leftover.write(spool.read())
+                os.remove(path)
+            else:
+                os.replace(path, replaying)
+        elif not os.path.exists(replaying):
+            return 0, 0
+    with open(replaying, encoding="utf-8") as spool:
+        entries = [json.loads(line) for line in spool if line.strip()]
+    for entry in entries:
+        entry["timestamp"] = parse_datetime(entry["timestamp"])
+    try:
+        # several INSERT batches: all or none, so a failure can't spool rows twice
+        with transaction.atomic():
+            written, spooled = write_entries(entries), 0
+    except DatabaseError:
+        logger.exception("Could not replay %d activity log rows", len(entries))
+        spool_entries(entries)
+        written, spooled = 0, len(entries)
+    os.remove(replaying)
+    return written, spooled
+
+
+_buffer = ActivityBuffer()
+atexit.register(_buffer.flush)
+
+
+def queue_activity(entry):
+    if settings.ACTIVITY_LOG_BATCH_SIZE <= 1:
+        write_or_spool([entry])
+    else:
+        _buffer.add(entry)
+
+
+def flush_activity():
+    return _buffer.flush()
@@ -0,0 +1,72 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Separate pools, so slow work of one kind (e.g. PDF extraction) can't
+# hold up the rest
+_executors = {}  # pool name -> (pid, ThreadPoolExecutor)
+_executor_lock = threading.Lock()
+
+
+def _pool_size(pool):
+    return {
+        "default": settings.BACKGROUND_THREADS,
+        "extraction": settings.PDF_EXTRACTION_THREADS,
+    }[pool]
+
+
+def _get_executor(pool="default"):
+    with _executor_lock:
+        pid, executor = _executors.get(pool, (None, None))
+        if executor is None or pid != os.getpid():
+            executor = ThreadPoolExecutor(
+                max_workers=_pool_size(pool),
+                thread_name_prefix=f"pramiti-{pool}",
+            )
+            _executors[pool] = (os.getpid(), executor)
+    return executor
+
+
+def _run(fn, args, kwargs):
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(fn, "__name__", fn))
+        raise
+    finally:
+        close_old_connections()
+
+
+def submit_to(pool, fn, *args, **kwargs):
+    """
+    Run fn on the named background thread pool, returns a Future
+    """
+    return _get_executor(pool).submit(_run, fn, args, kwargs)
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Run fn on the shared background thread pool, returns a Future
+    """
+    return submit_to("default", fn, *args, **kwargs)
+
+
+def run_in_pool(pool, fn, *args, **kwargs):
+    """
+    Run fn on the named pool once the current transaction commits
+    """
+    transaction.on_commit(lambda: submit_to(pool, fn, *args, **kwargs))
+
+
+def run_in_background(fn, *args, **kwargs):
+    """
+    Run fn off the request path once the current transaction commits
+    """
+    run_in_pool("default", fn, *args, **kwargs)
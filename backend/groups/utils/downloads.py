@@ -0,0 +1,118 @@
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeFile:
+    """
+    File object limited to one byte range. Exposes fileno() so WSGI servers
+    with a sendfile() file_wrapper (e.g. gunicorn) send the range with
+    os.sendfile; the server uses the current offset and Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        self._file = file
+        self._file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self._file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, inclusive. None means serve the
+    whole file (no/unsupported range), ValueError means unsatisfiable.
+    """
+    match = RANGE_RE.match((header or "").strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def etag_matches(header, etag):
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+def serve_file(request, field_file, filename, etag):
+    """
+    Response for a stored file, with ETag and single Range support. When
+    DOCUMENT_SENDFILE_BACKEND is set the bytes are sent by the front proxy
+    instead of Python.
+    """
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    disposition = content_disposition_header(as_attachment=False, filename=filename)
+
+    backend = settings.DOCUMENT_SENDFILE_BACKEND
+    if backend:
+        response = HttpResponse(content_type=content_type)
+        if backend == "x-accel-redirect":
+            # nginx serves the internal location and handles Range itself
+            response["X-Accel-Redirect"] = settings.DOCUMENT_ACCEL_REDIRECT_PREFIX + quote(field_file.name)
+        else:
+            response["X-Sendfile"] = field_file.path
+        response["Content-Disposition"] = disposition
+        response["Cache-Control"] = "private"
+        response["ETag"] = etag
+        return response
+
+    if etag_matches(request.headers.get("If-None-Match", ""), etag):
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    size = field_file.size
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    file = open(field_file.path, "rb")
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    else:
+        response = FileResponse(file, content_type=content_type)
+
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = disposition
+    response["Cache-Control"] = "private"
+    response["ETag"] = etag
+    return response
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from accounts.authentication import UserOrgJWTAuthentication
+from accounts.models import User
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------
+# Broker backends: publish(user_id, message) from any thread,
+# subscribe(user_id) as an async context manager yielding an asyncio.Queue
+# ---------------------------
+class InProcessBroker:
+    """
+    Delivers to connections served by this process only: for development
+    or a single ASGI worker. DatabaseBroker works across processes.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)  # user_id -> {(loop, queue)}
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, message)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=settings.NOTIFICATION_STREAM_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(subscriber)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+
+def _offer(queue, message):
+    # A client that stopped reading loses messages rather than memory;
+    # it still has the list endpoint to catch up
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass
+
+
+class DatabaseBroker:
+    """
+    Works across worker processes and servers with no extra service: the
+    Notification rows are the messages. One thread per process polls the
+    table for the users connected to it every
+    NOTIFICATION_BROKER_POLL_SECONDS (one query per process, not per
+    connection), so publish() has nothing to do.
+    """
+
+    # A row shows up once its transaction commits, which can be a while
+    # after its created_at was set: every poll looks back this far
+    LOOK_BACK = timedelta(seconds=30)
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)  # user_id -> {(loop, queue, subscribed at)}
+        self._lock = threading.Lock()
+        self._poller_pid = None
+        self._since = timezone.now()
+        self._seen = {}  # notification id -> created_at, within the look-back
+
+    def publish(self, user_id, message):
+        pass
+
+    def _ensure_poller(self):
+        with self._lock:
+            if self._poller_pid != os.getpid():
+                # a forked worker doesn't inherit the parent's thread
+                threading.Thread(target=self._poll_forever, name="pramiti-notifications", daemon=True).start()
+                self._poller_pid = os.getpid()
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        self._ensure_poller()
+        queue = asyncio.Queue(maxsize=settings.NOTIFICATION_STREAM_QUEUE_SIZE)
+        # older rows are in the unread count the connection starts with
+        subscriber = (asyncio.get_running_loop(), queue, timezone.now())
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(subscriber)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+    def _poll_forever(self):
+        while True:
+            time.sleep(settings.NOTIFICATION_BROKER_POLL_SECONDS)
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Polling for new notifications failed")
+            finally:
+                close_old_connections()
+
+    def poll(self):
+        """
+        Deliver the notifications created since the last poll
+        """
+        from ..models import Notification
+        from .utils import notification_item
+
+        now = timezone.now()
+        with self._lock:
+            subscribers = {user_id: list(subs) for user_id, subs in self._subscribers.items()}
+        if not subscribers:
+            self._since, self._seen = now, {}
+            return
+
+        notifications = Notification.objects.filter(
+            user_id__in=list(subscribers), created_at__gte=self._since - self.LOOK_BACK,
+        ).order_by("created_at", "id")
+        for notification in notifications:
+            if notification.id in self._seen:
+                continue
+            self._seen[notification.id] = notification.created_at
+            message = {"type": "notification", "notification": notification_item(notification)}
+            for loop, queue, subscribed_at in subscribers[notification.user_id]:
+                if notification.created_at >= subscribed_at:
+                    loop.call_soon_threadsafe(_offer, queue, message)
+
+        self._since = now
+        self._seen = {
+            notification_id: created_at for notification_id, created_at in self._seen.items()
+            if created_at >= now - self.LOOK_BACK
+        }
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.NOTIFICATION_BROKER_BACKEND)()
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    if setting == "NOTIFICATION_BROKER_BACKEND":
+        get_broker.cache_clear()
+
+
+def publish_notifications(notifications):
+    """
+    Push new notifications to their users' open connections once the
+    surrounding transaction commits
+    """
+    from .utils import notification_item
+
+    messages = [(n.user_id, {"type": "notification", "notification": notification_item(n)}) for n in notifications]
+
+    def publish():
+        broker = get_broker()
+        for user_id, message in messages:
+            broker.publish(user_id, message)
+
+    transaction.on_commit(publish)
+
+
+# ---------------------------
+# Auth for push connections. Tokens never go in URLs (they end up in
+# access logs and browser history): SSE clients send the Authorization
+# header, WebSocket clients send the token as their first message.
+# ---------------------------
+def authenticate_token(raw_token):
+    """
+    The User for a JWT access token, or None. Organizations have no
+    notifications, so their tokens are refused too.
+    """
+    if not raw_token or not isinstance(raw_token, (str, bytes)):
+        return None
+    auth = UserOrgJWTAuthentication()
+    try:
+        user = auth.get_user(auth.get_validated_token(raw_token))
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    return user if isinstance(user, User) else None
+
+
+def authenticate_request(request):
+    auth = UserOrgJWTAuthentication()
+    header = auth.get_header(request)
+    return authenticate_token(auth.get_raw_token(header) if header else None)
+
+
+# ---------------------------
+# One push connection's messages
+# ---------------------------
+async def notification_messages(user):
+    """
+    The unread count first, then every new notification for the user.
+    Yields None after NOTIFICATION_STREAM_KEEPALIVE_SECONDS without one,
+    so the connection can send a keepalive.
+    """
+    from .utils import get_unread_count
+
+    async with get_broker().subscribe(user.id) as queue:
+        # subscribed before counting, so nothing falls between the two
+        yield {"type": "unread_count", "unread_count": await sync_to_async(get_unread_count)(user)}
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), settings.NOTIFICATION_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
@@ -0,0 +1,192 @@
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.db.models.functions import Greatest
+
+from ..models import Group, GroupMember, Document, DocumentReadStatus, GroupStats, DocumentStats
+
+REBUILD_BATCH_SIZE = 1000
+
+
+# ---------------------------
+# Atomic updates from the write paths
+# ---------------------------
+def _bump(model, pk, deltas, rebuild):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0) for field, delta in deltas.items()}
+    )
+    if not updated and rebuild:
+        # No stats row yet (e.g. created before the stats tables): compute it
+        rebuild([pk])
+
+
+def bump_group_stats(group_id, create_missing=True, **deltas):
+    """
+    e.g. bump_group_stats(group.id, questions_count=1)
+    """
+    _bump(GroupStats, group_id, deltas, rebuild_group_stats if create_missing else None)
+
+
+def bump_document_stats(document_id, create_missing=True, **deltas):
+    _bump(DocumentStats, document_id, deltas, rebuild_document_stats if create_missing else None)
+
+
+# ---------------------------
+# Recompute from the source tables (repairs drift)
+# ---------------------------
+def _batches(ids):
+    for start in range(0, len(ids), REBUILD_BATCH_SIZE):
+        yield ids[start:start + REBUILD_BATCH_SIZE]
+
+
+def _counts(queryset, key, **aggregates):
+    return {
+        row[key]: row
+        for row in queryset.order_by().values(key).annotate(**aggregates)
+    }
+
+
+def rebuild_group_stats(group_ids=None):
+    from pramiti_ai.models import AIQuestion
+
+    if group_ids is None:
+        group_ids = list(Group.objects.order_by("id").values_list("id", flat=True))
+
+    for batch in _batches(list(group_ids)):
+        members = _counts(GroupMember.objects.filter(group_id__in=batch, status="active"), "group", n=Count("id"))
+        documents = _counts(Document.objects.filter(group_id__in=batch), "group", n=Count("id"))
+        questions = _counts(AIQuestion.objects.filter(group_id__in=batch), "group", n=Count("id"))
+        existing = set(Group.objects.filter(id__in=batch).values_list("id", flat=True))
+
+        GroupStats.objects.bulk_create(
+            [
+                GroupStats(
+                    group_id=group_id,
+                    members_count=members.get(group_id, {}).get("n", 0),
+                    documents_count=documents.get(group_id, {}).get("n", 0),
+                    questions_count=questions.get(group_id, {}).get("n", 0),
+                )
+                for group_id in batch if group_id in existing
+            ],
+            update_conflicts=True,
+            unique_fields=["group"],
+            update_fields=["members_count", "documents_count", "questions_count"],
+        )
+    return len(group_ids)
+
+
+def rebuild_document_stats(document_ids=None):
+    from pramiti_ai.models import AIQuestion
+
+    if document_ids is None:
+        document_ids = list(Document.objects.order_by("id").values_list("id", flat=True))
+
+    for batch in _batches(list(document_ids)):
+        questions = _counts(AIQuestion.objects.filter(document_id__in=batch), "document", n=Count("id"))
+        reads = _counts(
+            DocumentReadStatus.objects.filter(document_id__in=batch),
+            "document",
+            readers=Count("id", filter=Q(read_time_seconds__gt=0)),
+            completed=Count("id", filter=Q(is_completed=True)),
+            seconds=Sum("read_time_seconds"),
+        )
+        existing = set(Document.objects.filter(id__in=batch).values_list("id", flat=True))
+
+        rows = []
+        for document_id in batch:
+            if document_id not in existing:
+                continue
+            read = reads.get(document_id, {})
+            rows.append(DocumentStats(
+                document_id=document_id,
+                questions_count=questions.get(document_id, {}).get("n", 0),
+                readers_count=read.get("readers", 0),
+                completed_count=read.get("completed", 0),
+                total_read_seconds=read.get("seconds") or 0,
+            ))
+        DocumentStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["document"],
+            update_fields=["questions_count", "readers_count", "completed_count", "total_read_seconds"],
+        )
+    return len(document_ids)
+
+
+# ---------------------------
+# Completion metrics for a whole group's documents
+# ---------------------------
+def group_completion_metrics(group_id):
+    """
+    Serializer context for DocumentSerializer: completed readers per
+    document (one grouped query) and the group's active member count
+    """
+    completed = (
+        DocumentReadStatus.objects.filter(document__group_id=group_id, is_completed=True)
+        .order_by()
+        .values("document")
+        .annotate(n=Count("id"))
+        .values_list("document", "n")
+    )
+    return {
+        "completed_counts": dict(completed),
+        "active_members_count": GroupMember.objects.filter(group_id=group_id, status="active").count(),
+    }
+
+
+# ---------------------------
+# Read-time distribution of a document (computed in the database)
+# ---------------------------
+# Histogram bucket lower bounds, in seconds
+READ_TIME_BUCKETS = [0, 30, 60, 120, 300, 600, 1800, 3600]
+
+
+def read_time_percentile(read_statuses, fraction, count):
+    """
+    Interpolated percentile of read_time_seconds; fetches at most two rows
+    through an ordered OFFSET (index on document, read_time_seconds)
+    """
+    if not count:
+        return 0
+    position = fraction * (count - 1)
+    lower = int(position)
+    values = list(
+        read_statuses.order_by("read_time_seconds").values_list("read_time_seconds", flat=True)[lower:lower + 2]
+    )
+    if len(values) == 1:
+        return values[0]
+    return values[0] + (values[1] - values[0]) * (position - lower)
+
+
+def read_time_histogram(read_statuses):
+    """
+    Rows per READ_TIME_BUCKETS bucket, in one aggregate query
+    """
+    bounds = READ_TIME_BUCKETS + [None]
+    aggregates = {}
+    for i, (low, high) in enumerate(zip(bounds, bounds[1:])):
+        condition = Q(read_time_seconds__gte=low)
+        if high is not None:
+            condition &= Q(read_time_seconds__lt=high)
+        aggregates[f"b{i}"] = Count("id", filter=condition)
+    counts = read_statuses.aggregate(**aggregates)
+
+    return [
+        {"min_seconds": low, "max_seconds": high, "count": counts[f"b{i}"]}
+        for i, (low, high) in enumerate(zip(bounds, bounds[1:]))
+    ]
+
+
+def document_read_time_stats(document):
+    read_statuses = DocumentReadStatus.objects.filter(document=document)
+    summary = read_statuses.aggregate(count=Count("id"), avg=Avg("read_time_seconds"), max=Max("read_time_seconds"))
+    count = summary["count"]
+    return {
+        "count": count,
+        "avg_seconds": summary["avg"] or 0,
+        "median_seconds": read_time_percentile(read_statuses, 0.5, count),
+        "p90_seconds": read_time_percentile(read_statuses, 0.9, count),
+        "max_seconds": summary["max"] or 0,
+        "histogram": read_time_histogram(read_statuses),
+    }
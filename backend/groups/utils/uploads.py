@@ -0,0 +1,81 @@
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+
+from ..models import DocumentBlob
+
+
+# ---------------------------
+# Upload handlers: SHA-256 computed while the upload streams in
+# ---------------------------
+class HashingUploadMixin:
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self.sha256.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_sha256(uploaded):
+    """
+    Hash from the upload handler, or read the file if it wasn't hashed
+    """
+    sha256 = getattr(uploaded, "sha256", None)
+    if sha256:
+        return sha256
+    hasher = hashlib.sha256()
+    uploaded.seek(0)
+    for chunk in uploaded.chunks():
+        hasher.update(chunk)
+    uploaded.seek(0)
+    return hasher.hexdigest()
+
+
+def format_file_size(num_bytes):
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{int(size)} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+# ---------------------------
+# Content-addressed storage
+# ---------------------------
+def get_or_create_blob(uploaded):
+    """
+    The DocumentBlob for this upload's content; the file is only written
+    to storage the first time its hash is seen. Returns (blob, created).
+    """
+    sha256 = file_sha256(uploaded)
+    blob = DocumentBlob.objects.filter(sha256=sha256).first()
+    if blob:
+        return blob, False
+
+    blob = DocumentBlob(sha256=sha256, size=uploaded.size)
+    blob.file.save(uploaded.name, uploaded, save=False)
+    try:
+        with transaction.atomic():
+            blob.save()
+    except IntegrityError:
+        # Same file uploaded concurrently: keep the other copy
+        blob.file.delete(save=False)
+        return DocumentBlob.objects.get(sha256=sha256), False
+    return blob, True
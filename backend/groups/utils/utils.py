@@ -1,27 +1,220 @@
-from django.contrib.contenttypes.models import ContentType
-from ..models import ActivityLog
+from django.utils import timezone
+from accounts.models import Organization
+from .activity import content_type_id, queue_activity
 
 def log_activity(user=None, group=None, document=None, action=""):
+    """
+    Queue an ActivityLog row; written in bulk by the buffer in activity.py
+    """
     if user:
-        ActivityLog.objects.create(
-            content_type=ContentType.objects.get_for_model(user),
-            object_id=user.id,
-            group=group,
-            document=document,
-            action=action
+        queue_activity({
+            "content_type_id": content_type_id(type(user)),
+            "object_id": user.id,
+            "actor_user_id": None if isinstance(user, Organization) else user.id,
+            "actor_org_id": user.id if isinstance(user, Organization) else None,
+            "group_id": group.id if group else None,
+            "document_id": document.id if document else None,
+            "action": action,
+            "timestamp": timezone.now(),
+        })
+
+
+import base64
+import binascii
+from collections import Counter, defaultdict
+from datetime import datetime
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils.timesince import timesince
+from ..models import Notification, NotificationCounter
+from .realtime import publish_notifications
+
+
+def notification_item(notification):
+    """
+    A notification as listed to (and pushed to) its user
+    """
+    return {
+        "id": notification.id,
+        "title": notification.get_type_display(),
+        "message": notification.message,
+        "time": timesince(notification.created_at) + " ago",
+        "read": notification.read,
+        "cursor": encode_notification_cursor(notification),
+    }
+
+
+# ---------------------------
+# Notification list cursors: "<created_at ISO>|<id>", base64
+# ---------------------------
+NOTIFICATIONS_PAGE_SIZE = 20
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+NOTIFICATIONS_MAX_MARK_IDS = 1000
+
+
+def encode_notification_cursor(notification):
+    raw = f"{notification.created_at.isoformat()}|{notification.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_notification_cursor(cursor):
+    """
+    (created_at, id) or None; ValueError if the cursor is malformed
+    """
+    if not cursor:
+        return None
+    try:
+        created_at, notif_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(notif_id)
+    except (binascii.Error, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+# ---------------------------
+# Unread counters
+# ---------------------------
+def _change_unread(per_user_counts, sign):
+    """
+    Apply (user_id, n) changes to the unread counters, one UPDATE per
+    distinct n. Returns the user ids that have no counter row yet.
+    """
+    by_count = defaultdict(list)
+    for user_id, n in per_user_counts:
+        by_count[n].append(user_id)
+    updated = 0
+    for n, user_ids in by_count.items():
+        updated += NotificationCounter.objects.filter(user_id__in=user_ids).update(
+            unread_count=Greatest(F("unread_count") + sign * n, 0)
+        )
+    user_ids = {user_id for ids in by_count.values() for user_id in ids}
+    if updated == len(user_ids):
+        return set()
+    return user_ids - set(
+        NotificationCounter.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True)
+    )
+
+
+def add_unread(user_ids):
+    """
+    One more unread notification for each id (after the rows are inserted).
+    Users without a counter get one counted from their notifications.
+    """
+    missing = _change_unread(Counter(user_ids).items(), 1)
+    if missing:
+        unread = dict(
+            Notification.objects.filter(user_id__in=missing, read=False).order_by()
+            .values("user").annotate(n=Count("id")).values_list("user", "n")
+        )
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id, unread_count=unread.get(user_id, 0)) for user_id in missing],
+            ignore_conflicts=True,
         )
 
 
-from ..models import Notification
+def forget_unread(notifications):
+    """
+    Take a queryset's unread notifications off their owners' counters
+    (before they are marked read or deleted)
+    """
+    _change_unread(
+        notifications.filter(read=False).order_by().values("user").annotate(n=Count("id")).values_list("user", "n"),
+        -1,
+    )
+
+
+def get_unread_count(user):
+    counter = NotificationCounter.objects.filter(user=user).values_list("unread_count", flat=True).first()
+    if counter is None:
+        counter = Notification.objects.filter(user=user, read=False).count()
+        NotificationCounter.objects.get_or_create(user=user, defaults={"unread_count": counter})
+    return counter
+
+
+def mark_notifications_read(user, notifications):
+    """
+    Mark the user's notifications in a queryset read with one UPDATE and
+    take exactly that many off their unread counter. Returns the number marked.
+    """
+    marked = notifications.filter(user=user, read=False).update(read=True)
+    if marked:
+        _change_unread([(user.id, marked)], -1)
+    return marked
+
 
 def create_notification(user, notif_type, message, group=None, document=None):
     """
     Create and save a notification in DB
     """
-    Notification.objects.create(
+    notification = Notification.objects.create(
         user=user,
         type=notif_type,
         message=message,
         group=group,
         document=document
     )
+    add_unread([user.id])
+    publish_notifications([notification])
+    return notification
+
+
+from django.conf import settings
+from ..models import GroupMember
+from .background import run_in_background
+
+
+def notify_users(user_ids, notif_type, message, group_id=None, document_id=None):
+    """
+    Bulk-create the same notification for many users, in batches.
+    Returns the number of notifications created.
+    """
+    batch_size = settings.NOTIFICATION_BATCH_SIZE
+    created_at = timezone.now()
+    batch = []
+    total = 0
+    for user_id in user_ids:
+        batch.append(Notification(
+            user_id=user_id,
+            type=notif_type,
+            message=message,
+            group_id=group_id,
+            document_id=document_id,
+            created_at=created_at,
+        ))
+        if len(batch) >= batch_size:
+            total += _create_batch(batch)
+            batch = []
+    if batch:
+        total += _create_batch(batch)
+    return total
+
+
+def _create_batch(notifications):
+    Notification.objects.bulk_create(notifications)
+    add_unread([n.user_id for n in notifications])
+    publish_notifications(notifications)
+    return len(notifications)
+
+
+def notify_group_members(group_id, notif_type, message, member_status=None, document_id=None):
+    """
+    Notify every member of a group (optionally only those with member_status)
+    """
+    members = GroupMember.objects.filter(group_id=group_id)
+    if member_status:
+        members = members.filter(status=member_status)
+    user_ids = members.values_list("user_id", flat=True).iterator(chunk_size=settings.NOTIFICATION_BATCH_SIZE)
+    return notify_users(user_ids, notif_type, message, group_id=group_id, document_id=document_id)
+
+
+def notify_group_members_async(group_id, notif_type, message, member_status=None, document_id=None):
+    """
+    notify_group_members on the background pool, after the request's transaction commits
+    """
+    run_in_background(
+        notify_group_members, group_id, notif_type, message,
+        member_status=member_status, document_id=document_id,
+    )
+
+
+def notify_users_async(user_ids, notif_type, message, group_id=None, document_id=None):
+    run_in_background(notify_users, list(user_ids), notif_type, message, group_id=group_id, document_id=document_id)
@@ -6,19 +6,27 @@ from rest_framework.views import APIView
 
 # ---------- Django Imports ----------
 from django.shortcuts import get_object_or_404
-from django.db.models import Avg, F, Count, Sum
-from django.utils.timesince import timesince
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.core.files.storage import default_storage
+from django.db.models import Avg, F, Count, Sum, Q
 from django.utils import timezone
 from datetime import timedelta
 from collections import defaultdict
+from asgiref.sync import sync_to_async
+import json
+import os
 
 # ---------- Local Models ----------
 from .models import (
     Group, Document, GroupMember, ActivityLog,
-    DocumentReadStatus, Notification
+    DocumentReadStatus, Notification, DocumentStats
 )
 from accounts.models import User, Organization
 from pramiti_ai.models import AIQuestion
+from pramiti_ai.utils.answer_cache import invalidate_document
+from pramiti_ai.utils.extraction import schedule_extraction
+from pramiti_ai.utils.previews import preview_path
 
 # ---------- Local Serializers ----------
 from .serializers import (
@@ -29,7 +37,16 @@ from .serializers import (
 )
 
 # ---------- Local Utilities ----------
-from .utils.utils import log_activity, create_notification
+from .utils.utils import (
+    log_activity, create_notification, notify_group_members_async, notify_users_async,
+    get_unread_count, mark_notifications_read,
+    encode_notification_cursor, decode_notification_cursor, notification_item,
+    NOTIFICATIONS_PAGE_SIZE, NOTIFICATIONS_MAX_PAGE_SIZE, NOTIFICATIONS_MAX_MARK_IDS,
+)
+from .utils.uploads import get_or_create_blob, format_file_size
+from .utils.downloads import etag_matches, serve_file
+from .utils.realtime import authenticate_request, notification_messages
+from .utils.stats import group_completion_metrics, document_read_time_stats
 
 # ---------------------------------------
 # Group List & Create
@@ -42,9 +59,9 @@ class GroupListCreate(generics.ListCreateAPIView):
         # Check if user is an Organization
         if isinstance(user, Organization):
             # Only groups belonging to this organization
-            return Group.objects.filter(organization=user).order_by("-id")
+            return Group.objects.filter(organization=user).with_counts().order_by("-id")
         # For normal users, show only groups they are members of
-        return Group.objects.filter(memberships__user=user).distinct().order_by("-id")
+        return Group.objects.filter(memberships__user=user).distinct().with_counts().order_by("-id")
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -59,11 +76,11 @@ class GroupListCreate(generics.ListCreateAPIView):
 # Group Detail
 # ---------------------------------------
 class GroupDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Group.objects.all()
+    queryset = Group.objects.with_counts()
     serializer_class = GroupSerializer
 
 class GroupDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Group.objects.all()
+    queryset = Group.objects.with_counts()
     serializer_class = GroupSerializer
 
     def patch(self, request, *args, **kwargs):
@@ -79,10 +96,11 @@ class GroupDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
 
     def destroy(self, request, *args, **kwargs):
         group = self.get_object()
-        for member in group.memberships.all():
-            message = f"The group '{group.name}' has been deleted."
-            create_notification(user=member.user, notif_type="group_deleted", message=message, group=group)
+        # Collected first: the memberships go with the group. The notifications
+        # can't point at the deleted group (they would be cascade-deleted too)
+        member_ids = list(group.memberships.values_list("user_id", flat=True))
         group.delete()
+        notify_users_async(member_ids, "group_deleted", f"The group '{group.name}' has been deleted.")
         return Response({"message": "Group deleted successfully!"}, status=status.HTTP_200_OK)
 
 # ---------------------------------------
@@ -100,14 +118,7 @@ class GroupArchiveAPIView(APIView):
             msg = "Group archived successfully!"
             notif_msg = f"The group '{group.name}' has been archived."
         group.save()
-        members = GroupMember.objects.filter(group=group)
-        for member in members:
-            create_notification(
-                user=member.user,
-                notif_type="group_status_changed",
-                message=notif_msg,
-                group=group
-            )
+        notify_group_members_async(group.id, "group_status_changed", notif_msg)
         return Response({"message": msg, "status": group.status}, status=status.HTTP_200_OK)
 
 # ---------------------------------------
@@ -128,7 +139,12 @@ class GroupDocumentsList(generics.ListAPIView):
 
     def get_queryset(self):
         group_id = self.kwargs["group_id"]
-        return Document.objects.filter(group_id=group_id).order_by("-uploaded_on")
+        return Document.objects.filter(group_id=group_id).select_related("blob", "uploaded_by").order_by("-uploaded_on")
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update(group_completion_metrics(self.kwargs["group_id"]))
+        return context
 
 # ---------------------------------------
 # Upload Document
@@ -139,23 +155,27 @@ class UploadDocumentAPI(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         group_id = self.kwargs["group_id"]
-        document = serializer.save(group_id=group_id, uploaded_by=self.request.user)
+        # Identical files share one stored copy (and one extraction)
+        blob, _ = get_or_create_blob(serializer.validated_data["file"])
+        document = serializer.save(
+            group_id=group_id,
+            uploaded_by=self.request.user,
+            blob=blob,
+            file=blob.file.name,
+            file_size=format_file_size(blob.size),
+        )
+        schedule_extraction(document)
         log_activity(
             user=self.request.user,
             group=document.group,
             document=document,
             action=f"Document '{document.title}' uploaded"
         )
-        active_members = GroupMember.objects.filter(group_id=group_id, status='active')
-        for member in active_members:
-            message = f"New document '{document.title}' has been uploaded in group '{document.group.name}'."
-            create_notification(
-                user=member.user,
-                notif_type="document_uploaded",
-                message=message,
-                group=document.group,
-                document=document
-            )
+        message = f"New document '{document.title}' has been uploaded in group '{document.group.name}'."
+        notify_group_members_async(
+            document.group_id, "document_uploaded", message,
+            member_status="active", document_id=document.id,
+        )
 
 # ---------------------------------------
 # Delete Document
@@ -167,6 +187,7 @@ class DeleteDocumentAPI(APIView):
         except Document.DoesNotExist:
             return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
 
+        invalidate_document(document.id)
         document.delete()
         return Response({"message": "Document deleted successfully"}, status=status.HTTP_200_OK)
 
@@ -174,9 +195,72 @@ class DeleteDocumentAPI(APIView):
 # Document Detail
 # ---------------------------------------
 class DocumentDetailAPI(generics.RetrieveAPIView):
-    queryset = Document.objects.all()
+    queryset = Document.objects.select_related("blob")
     serializer_class = DocumentSerializer
 
+# ---------------------------------------
+# Document Download (Range / ETag / X-Sendfile)
+# ---------------------------------------
+def _document_access_error(user, document):
+    """
+    Error Response if the user may not open the document's files
+    (organization owning the group, or one of its active members), else None
+    """
+    if isinstance(user, Organization):
+        allowed = document.group.organization_id == user.id
+    elif isinstance(user, User):
+        allowed = GroupMember.objects.filter(group=document.group, user=user, status="active").exists()
+    else:
+        return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+    if not allowed:
+        return Response({"error": "You are not a member of this group"}, status=status.HTTP_403_FORBIDDEN)
+    return None
+
+
+class DocumentDownloadAPI(APIView):
+    def get(self, request, doc_id):
+        document = get_object_or_404(Document.objects.select_related("group", "blob"), id=doc_id)
+        error = _document_access_error(request.user, document)
+        if error:
+            return error
+
+        if not document.file or not document.file.storage.exists(document.file.name):
+            return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        extension = os.path.splitext(document.file.name)[1]
+        filename = document.title if document.title.lower().endswith(extension.lower()) else document.title + extension
+        if document.blob_id:
+            etag = f'"{document.blob.sha256}"'
+        else:
+            stat = os.stat(document.file.path)
+            etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+        return serve_file(request, document.file, filename, etag)
+
+# ---------------------------------------
+# Document Previews (same access as downloads)
+# ---------------------------------------
+class DocumentPreviewAPI(APIView):
+    def get(self, request, doc_id, name):
+        document = get_object_or_404(Document.objects.select_related("group", "blob"), id=doc_id)
+        error = _document_access_error(request.user, document)
+        if error:
+            return error
+
+        path = preview_path(document.blob.sha256, name) if document.blob_id else None
+        if not path or not default_storage.exists(path):
+            return Response({"error": "Preview not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # the image never changes for a given file, but access can be revoked:
+        # private caching only, revalidated daily
+        etag = f'"{document.blob.sha256}-{name}"'
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            response = HttpResponse(status=304)
+        else:
+            response = FileResponse(default_storage.open(path, "rb"), content_type="image/webp")
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, max-age=86400"
+        return response
+
 # ---------------------------------------
 # Activity Log for Document
 # ---------------------------------------
@@ -185,7 +269,7 @@ class DocumentActivityAPI(generics.ListAPIView):
 
     def get_queryset(self):
         doc_id = self.kwargs["doc_id"]
-        return ActivityLog.objects.filter(document_id=doc_id).order_by("-timestamp")
+        return ActivityLog.objects.filter(document_id=doc_id).select_related("actor_user", "actor_org").order_by("-timestamp")
 
 # ---------------------------------------
 # Join Group
@@ -212,17 +296,15 @@ class UserGroupsList(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return Group.objects.filter(memberships__user=user).order_by('-id')
+        return GroupMember.objects.filter(user=user).select_related('group').order_by('-group_id')
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serialized = []
-        for group in queryset:
-            membership = GroupMember.objects.get(group=group, user=request.user)
-            data = UserGroupSerializer(group, context={"request": request}).data
-            data["role"] = membership.role
-            serialized.append(data)
-        return Response(serialized)
+        # One query: the memberships carry role / status for the serializer
+        memberships = list(self.get_queryset())
+        context = self.get_serializer_context()
+        context["memberships"] = {m.group_id: m for m in memberships}
+        serializer = UserGroupSerializer([m.group for m in memberships], many=True, context=context)
+        return Response(serializer.data)
 
 # ---------------------------------------
 # Organization Members List
@@ -325,7 +407,8 @@ class UpdateReadStatusAPI(generics.GenericAPIView):
             obj.is_completed = True
             log_activity(user=user, group=document.group, document=document, action=f"'{user.full_name}' completed reading the document.")
         obj.save()
-        document.readers = document.read_statuses.filter(read_time_seconds__gt=0).count()
+        # DocumentStats is kept current by the read status post_save signal
+        document.readers = DocumentStats.objects.filter(document=document).values_list("readers_count", flat=True).first() or 0
         document.save()
         return Response({
             "message": "Read status updated",
@@ -363,39 +446,128 @@ class DocumentEngagementView(APIView):
                 })
         return Response({"engagements": engagements_data})
 
+# ---------------------------------------
+# Document Read-Time Analytics
+# ---------------------------------------
+class DocumentReadTimeStatsView(APIView):
+    def get(self, request, document_id):
+        try:
+            document = Document.objects.get(id=document_id)
+        except Document.DoesNotExist:
+            return Response({"error": "Document not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({"document": document.id, **document_read_time_stats(document)})
+
 # ---------------------------------------
 # Notifications
 # ---------------------------------------
 class UserNotificationsAPI(APIView):
+    """
+    Newest first, keyset-paginated on (created_at, id):
+    ?limit=20&cursor=<next_cursor of the previous page>
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        notifs = Notification.objects.filter(user=user).order_by('-created_at')
-        notif_list = [
-            {
-                "id": n.id,
-                "title": n.get_type_display(),
-                "message": n.message,
-                "time": timesince(n.created_at) + " ago",
-                "read": n.read,
-            }
-            for n in notifs
-        ]
-        unread_count = notifs.filter(read=False).count()
-        return Response({"notifications": notif_list, "unread_count": unread_count})
+        try:
+            limit = min(int(request.query_params.get("limit", NOTIFICATIONS_PAGE_SIZE)), NOTIFICATIONS_MAX_PAGE_SIZE)
+            position = decode_notification_cursor(request.query_params.get("cursor"))
+        except ValueError:
+            return Response({"error": "Invalid cursor or limit"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"error": "Invalid cursor or limit"}, status=status.HTTP_400_BAD_REQUEST)
+
+        notifs = Notification.objects.filter(user=user)
+        if position:
+            created_at, notif_id = position
+            notifs = notifs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=notif_id))
+        page = list(notifs.order_by('-created_at', '-id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        notif_list = [notification_item(n) for n in page]
+        return Response({
+            "notifications": notif_list,
+            "unread_count": get_unread_count(user),
+            "next_cursor": encode_notification_cursor(page[-1]) if has_more else None,
+        })
 
 class MarkNotificationReadAPI(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, notif_id):
-        try:
-            notif = Notification.objects.get(id=notif_id, user=request.user)
-            notif.read = True
-            notif.save()
-            return Response({"success": True})
-        except Notification.DoesNotExist:
+        notifs = Notification.objects.filter(id=notif_id, user=request.user)
+        if not mark_notifications_read(request.user, notifs) and not notifs.exists():
             return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"success": True})
+
+class MarkNotificationsReadAPI(APIView):
+    """
+    Mark many of the user's notifications read in one UPDATE. The body
+    holds exactly one of:
+      {"all": true}
+      {"ids": [1, 2, 3]}
+      {"cursor": "..."}  the notification with this cursor and every older one
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        notifs = Notification.objects.filter(user=request.user)
+        data = request.data
+        if len([key for key in ("all", "ids", "cursor") if key in data]) != 1:
+            return Response({"error": "Send one of all, ids or cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if "ids" in data:
+            ids = data["ids"]
+            if (
+                not isinstance(ids, list)
+                or len(ids) > NOTIFICATIONS_MAX_MARK_IDS
+                # bools are ints to isinstance(); true would mark notification 1
+                or not all(type(i) is int for i in ids)
+            ):
+                return Response(
+                    {"error": f"ids must be a list of at most {NOTIFICATIONS_MAX_MARK_IDS} notification ids"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            notifs = notifs.filter(id__in=ids)
+        elif "cursor" in data:
+            try:
+                position = decode_notification_cursor(data["cursor"])
+            except (ValueError, AttributeError):
+                position = None
+            if not position:
+                return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+            created_at, notif_id = position
+            notifs = notifs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lte=notif_id))
+        elif data["all"] is not True:
+            return Response({"error": "all must be true"}, status=status.HTTP_400_BAD_REQUEST)
+
+        marked = mark_notifications_read(request.user, notifs)
+        return Response({"marked": marked, "unread_count": get_unread_count(request.user)})
+
+@require_GET
+async def notifications_stream(request):
+    """
+    Server-Sent Events push of the user's notifications (see
+    groups/consumers.py for the WebSocket equivalent), for clients that
+    can send the Authorization header (fetch() streams, not EventSource)
+    """
+    user = await sync_to_async(authenticate_request)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    async def events():
+        async for message in notification_messages(user):
+            if message is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # let nginx flush every event
+    return response
 
 # ---------------------------------------
 # Admin Dashboard
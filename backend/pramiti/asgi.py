@@ -2,6 +2,18 @@
 ASGI config for pramiti project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server so async views such as the streamed ask-AI
+endpoint (``documents/<id>/ask-ai/stream/``) don't hold a worker per request.
+WebSocket connections are routed here too (``ws/notifications/``).
+
+Run it with uvicorn (in requirements.txt), e.g.::
+
+    uvicorn pramiti.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+Notification pushes reach every worker through the database
+(NOTIFICATION_BROKER_BACKEND). Under a WSGI server such as gunicorn the
+WebSocket endpoint is unavailable; the frontend then falls back to
+polling the unread count.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +25,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pramiti.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the app registry is ready
+from groups.consumers import notifications_websocket  # noqa: E402
+
+WEBSOCKET_ROUTES = {
+    "/ws/notifications/": notifications_websocket,
+}
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        handler = WEBSOCKET_ROUTES.get(scope["path"])
+        if handler is None:
+            await receive()
+            await send({"type": "websocket.close"})
+            return
+        return await handler(scope, receive, send)
+    return await django_application(scope, receive, send)
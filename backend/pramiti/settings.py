@@ -160,6 +160,88 @@ SIMPLE_JWT = {
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"   # BASE_DIR is usually where manage.py lives
+
+# Uploads are hashed (SHA-256) while they stream in, for content-addressed storage
+FILE_UPLOAD_HANDLERS = [
+    "groups.utils.uploads.HashingMemoryFileUploadHandler",
+    "groups.utils.uploads.HashingTemporaryFileUploadHandler",
+]
+
+# Document downloads: "" streams from Python (os.sendfile via the WSGI file
+# wrapper), "x-accel-redirect" hands off to nginx, "x-sendfile" to Apache/lighttpd
+DOCUMENT_SENDFILE_BACKEND = os.getenv("DOCUMENT_SENDFILE_BACKEND", "").lower()
+# nginx "internal" location aliased to MEDIA_ROOT
+DOCUMENT_ACCEL_REDIRECT_PREFIX = os.getenv("DOCUMENT_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+
+# Thumbnail and low-resolution page previews rendered at upload (pixels wide)
+DOCUMENT_THUMBNAIL_WIDTH = int(os.getenv("DOCUMENT_THUMBNAIL_WIDTH", 240))
+DOCUMENT_PREVIEW_WIDTH = int(os.getenv("DOCUMENT_PREVIEW_WIDTH", 800))
+DOCUMENT_PREVIEW_PAGES = int(os.getenv("DOCUMENT_PREVIEW_PAGES", 5))
 import os
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# AI retrieval: only the most relevant chunks of a document are sent to the model
+AI_CHUNK_SIZE_WORDS = int(os.getenv("AI_CHUNK_SIZE_WORDS", 200))
+AI_CHUNK_OVERLAP_WORDS = int(os.getenv("AI_CHUNK_OVERLAP_WORDS", 40))
+AI_RETRIEVAL_TOP_K = int(os.getenv("AI_RETRIEVAL_TOP_K", 8))
+AI_CONTEXT_TOKEN_BUDGET = int(os.getenv("AI_CONTEXT_TOKEN_BUDGET", 4000))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Answers to repeated AI questions, plus the leases that coalesce
+    # identical in-flight questions, so it must be shared by every worker
+    # process. The default database table expires entries by TTL but is
+    # NOT an LRU: past MAX_ENTRIES it culls a slice of rows in key order,
+    # whatever their use. For LRU eviction use Redis
+    # (AI_ANSWER_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache,
+    # AI_ANSWER_CACHE_LOCATION=redis://..., with maxmemory-policy allkeys-lru);
+    # that's the recommended backend in production
+    "ai_answers": {
+        "BACKEND": os.getenv("AI_ANSWER_CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": os.getenv("AI_ANSWER_CACHE_LOCATION", "ai_answer_cache"),
+        "TIMEOUT": int(os.getenv("AI_ANSWER_CACHE_TTL", 60 * 60 * 24)),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("AI_ANSWER_CACHE_SIZE", 5000))},
+    },
+}
+
+# Async ask-AI: questions are queued as 'pending' and answered by `manage.py run_ai_workers`
+AI_ASK_ASYNC = os.getenv("AI_ASK_ASYNC", "false").lower() == "true"
+AI_JOB_TIMEOUT_SECONDS = int(os.getenv("AI_JOB_TIMEOUT_SECONDS", 300))  # reclaim jobs from dead workers
+AI_JOB_RETRY_SECONDS = int(os.getenv("AI_JOB_RETRY_SECONDS", 10))  # first wait for a document still extracting, doubled each retry
+AI_JOB_MAX_RETRIES = int(os.getenv("AI_JOB_MAX_RETRIES", 5))
+
+# LLM provider: "gemini", "stub" (deterministic, offline) or a dotted path to an LLMProvider subclass
+AI_PROVIDER_BACKEND = os.getenv("AI_PROVIDER_BACKEND", "gemini")
+AI_MODEL = os.getenv("AI_MODEL", "gemini-2.5-flash")
+AI_STUB_LATENCY_MS = int(os.getenv("AI_STUB_LATENCY_MS", 0))
+
+# Default max tokens per AI prompt (Organization.ai_prompt_token_budget overrides it)
+AI_ORG_PROMPT_TOKEN_BUDGET = int(os.getenv("AI_ORG_PROMPT_TOKEN_BUDGET", 8000))
+AI_BATCH_MAX_QUESTIONS = int(os.getenv("AI_BATCH_MAX_QUESTIONS", 25))
+
+# An identical question asked while one is being answered waits for that answer
+AI_SINGLEFLIGHT_LEASE_SECONDS = int(os.getenv("AI_SINGLEFLIGHT_LEASE_SECONDS", 60))  # longest wait on one
+AI_SINGLEFLIGHT_POLL_SECONDS = float(os.getenv("AI_SINGLEFLIGHT_POLL_SECONDS", 0.2))
+
+# Background work (upload pipeline)
+BACKGROUND_THREADS = int(os.getenv("BACKGROUND_THREADS", 4))
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", 500))  # rows per bulk INSERT in fan-outs
+PDF_EXTRACTION_THREADS = int(os.getenv("PDF_EXTRACTION_THREADS", 2))  # extractions running at once, own pool
+PDF_EXTRACTION_PROCESSES = int(os.getenv("PDF_EXTRACTION_PROCESSES", 2))
+PDF_EXTRACTION_TIMEOUT_SECONDS = int(os.getenv("PDF_EXTRACTION_TIMEOUT_SECONDS", 600))  # reclaim stuck extractions
+PDF_EXTRACTION_WAIT_SECONDS = int(os.getenv("PDF_EXTRACTION_WAIT_SECONDS", 60))  # how long an asker waits on one
+
+# Notification push (ws/notifications/ and notifications/stream/, see groups/utils/realtime.py)
+NOTIFICATION_BROKER_BACKEND = os.getenv("NOTIFICATION_BROKER_BACKEND", "groups.utils.realtime.DatabaseBroker")
+NOTIFICATION_BROKER_POLL_SECONDS = float(os.getenv("NOTIFICATION_BROKER_POLL_SECONDS", 2))  # DatabaseBroker push delay
+NOTIFICATION_AUTH_TIMEOUT_SECONDS = int(os.getenv("NOTIFICATION_AUTH_TIMEOUT_SECONDS", 10))  # WebSocket auth message
+NOTIFICATION_STREAM_KEEPALIVE_SECONDS = int(os.getenv("NOTIFICATION_STREAM_KEEPALIVE_SECONDS", 25))
+NOTIFICATION_STREAM_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", 100))  # undelivered messages kept per connection
+
+# Activity log write-behind buffer (groups/utils/activity.py); batch size 1 writes every row immediately
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", 200))
+ACTIVITY_LOG_FLUSH_SECONDS = float(os.getenv("ACTIVITY_LOG_FLUSH_SECONDS", 5))
+ACTIVITY_LOG_SPOOL_PATH = os.getenv("ACTIVITY_LOG_SPOOL_PATH", str(BASE_DIR / "activity_spool.jsonl"))  # rows the database refused
@@ -0,0 +1,91 @@
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from pramiti_ai.utils.pdf import extract_text_from_pdf
+
+WORDS = (
+    "policy leave employee payroll benefit holiday manager approval request "
+    "document section training compliance travel expense reimbursement notice"
+).split()
+
+
+def make_pdf(pages):
+    """
+    Minimal text PDF (Helvetica, one content stream per page)
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    font_id = 3 + 2 * len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+
+    for i, lines in enumerate(pages):
+        stream = "BT /F1 10 Tf 50 760 Td " + " ".join(f"({line}) Tj 0 -12 Td" for line in lines) + " ET"
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        ).encode())
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    parts = [b"%PDF-1.4\n"]
+    offsets = []
+    position = len(parts[0])
+    for number, body in enumerate(objects, 1):
+        offsets.append(position)
+        chunk = f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+        parts.append(chunk)
+        position += len(chunk)
+
+    xref = [f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()]
+    xref += [f"{offset:010d} 00000 n \n".encode() for offset in offsets]
+    trailer = f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{position}\n%%EOF\n".encode()
+    return b"".join(parts + xref) + trailer
+
+
+class Command(BaseCommand):
+    help = "Benchmark PDF text extraction engines on a generated corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=5)
+        parser.add_argument("--pages", type=int, default=50)
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for d in range(options["documents"]):
+                pages = [
+                    [" ".join(rng.choices(WORDS, k=12)) for _ in range(55)]
+                    for _ in range(options["pages"])
+                ]
+                path = Path(tmp) / f"doc{d}.pdf"
+                path.write_bytes(make_pdf(pages))
+                paths.append(str(path))
+
+            self.stdout.write(
+                f"{options['documents']} documents x {options['pages']} pages, "
+                f"{options['processes']} processes"
+            )
+            with ProcessPoolExecutor(max_workers=options["processes"]) as pool:
+                runs = [
+                    ("pdfplumber", dict(engine="pdfplumber")),
+                    ("pypdfium2", dict(engine="pdfium")),
+                    ("auto", dict(engine="auto")),
+                    ("auto + process pool", dict(engine="auto", executor=pool)),
+                ]
+                baseline = None
+                for name, kwargs in runs:
+                    start = time.perf_counter()
+                    chars = sum(len(extract_text_from_pdf(path, **kwargs)) for path in paths)
+                    elapsed = time.perf_counter() - start
+                    baseline = baseline or elapsed
+                    self.stdout.write(
+                        f"{name:<22} {elapsed:8.2f}s  {baseline / elapsed:6.1f}x  {chars} chars"
+                    )
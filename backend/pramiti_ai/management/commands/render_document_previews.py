@@ -0,0 +1,23 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from groups.models import DocumentBlob
+from pramiti_ai.utils.previews import ensure_previews
+
+
+class Command(BaseCommand):
+    help = "Render thumbnails and page previews for stored documents that have none yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2, help="Number of rendering processes")
+
+    def handle(self, *args, **options):
+        blobs = DocumentBlob.objects.filter(preview_count=0).order_by("id")
+        total = blobs.count()
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=options["processes"]) as pool:
+            for blob in blobs.iterator():
+                if ensure_previews(blob, executor=pool):
+                    rendered += 1
+        self.stdout.write(f"Rendered previews for {rendered} of {total} files")
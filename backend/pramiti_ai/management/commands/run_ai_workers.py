@@ -0,0 +1,50 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from pramiti_ai.utils.jobs import run_worker
+
+
+def _worker_main(poll_interval, burst, stop_event):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run_worker(poll_interval=poll_interval, burst=burst, should_stop=stop_event.is_set)
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that answer queued (async) AI questions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2, help="Number of worker processes")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        ctx = multiprocessing.get_context("fork")
+        stop_event = ctx.Event()
+
+        # Children must open their own DB connections
+        connections.close_all()
+
+        workers = [
+            ctx.Process(
+                target=_worker_main,
+                args=(options["poll_interval"], options["burst"], stop_event),
+                name=f"ai-worker-{i}",
+            )
+            for i in range(options["processes"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} AI workers")
+
+        def stop(signum, frame):
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        for worker in workers:
+            worker.join()
+        self.stdout.write("AI workers stopped")
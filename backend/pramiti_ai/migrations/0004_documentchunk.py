@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0003_remove_user_groups_remove_user_user_permissions_and_more'),
+        ('pramiti_ai', '0003_delete_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('text', models.TextField()),
+                ('token_count', models.PositiveIntegerField(default=0)),
+                ('term_freqs', models.JSONField(blank=True, default=dict)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='groups.document')),
+            ],
+            options={
+                'ordering': ['document', 'index'],
+                'unique_together': {('document', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pramiti_ai', '0004_documentchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiquestion',
+            name='served_from_cache',
+            field=models.BooleanField(default=False),
+        ),
+    ]
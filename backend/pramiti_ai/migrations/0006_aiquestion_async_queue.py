@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0004_document_content_hash'),
+        ('pramiti_ai', '0005_aiquestion_served_from_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiquestion',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='aiquestion',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('answered', 'Answered'), ('failed', 'Failed'), ('regenerated', 'Regenerated')], default='answered', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='aiquestion',
+            index=models.Index(fields=['status', 'asked_at'], name='pramiti_ai__status_491169_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pramiti_ai', '0006_aiquestion_async_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiquestion',
+            name='completion_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aiquestion',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
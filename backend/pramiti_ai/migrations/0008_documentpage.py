@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:20
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_pages(apps, schema_editor):
+    """
+    Existing documents only have the joined text, so it becomes page 1
+    """
+    Document = apps.get_model('groups', 'Document')
+    DocumentPage = apps.get_model('pramiti_ai', 'DocumentPage')
+
+    documents = Document.objects.exclude(content__isnull=True).exclude(content='').only('id', 'content', 'content_hash')
+    for document in documents.iterator(chunk_size=50):
+        text = document.content
+        DocumentPage.objects.create(
+            document_id=document.id,
+            page_number=1,
+            text=text,
+            start_offset=0,
+            end_offset=len(text),
+        )
+        Document.objects.filter(id=document.id).update(
+            page_count=1,
+            text_length=len(text),
+            content_hash=document.content_hash or hashlib.sha256(text.encode('utf-8')).hexdigest(),
+        )
+
+
+def restore_content(apps, schema_editor):
+    Document = apps.get_model('groups', 'Document')
+    DocumentPage = apps.get_model('pramiti_ai', 'DocumentPage')
+
+    document_ids = DocumentPage.objects.order_by('document_id').values_list('document_id', flat=True).distinct()
+    for document_id in document_ids.iterator():
+        texts = DocumentPage.objects.filter(document_id=document_id).order_by('page_number').values_list('text', flat=True)
+        Document.objects.filter(id=document_id).update(content="\n".join(texts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0006_document_page_count_text_length'),
+        ('pramiti_ai', '0007_aiquestion_token_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField()),
+                ('text', models.TextField(blank=True)),
+                ('start_offset', models.PositiveIntegerField()),
+                ('end_offset', models.PositiveIntegerField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='groups.document')),
+            ],
+            options={
+                'ordering': ['document', 'page_number'],
+                'unique_together': {('document', 'page_number')},
+            },
+        ),
+        migrations.RunPython(backfill_pages, restore_content),
+    ]
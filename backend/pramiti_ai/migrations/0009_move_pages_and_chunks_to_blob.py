@@ -0,0 +1,191 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:05
+
+import hashlib
+
+import django.db.models.deletion
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _stored_text(DocumentPage, document_id):
+    """
+    The document's pages joined as save_pages joins them, None if it has none
+    """
+    texts = DocumentPage.objects.filter(document_id=document_id).order_by('page_number').values_list('text', flat=True)
+    if not texts.exists():
+        return None
+    return "\n".join(t.strip() for t in texts if t and t.strip())
+
+
+def move_to_blobs(apps, schema_editor):
+    """
+    Hash every stored upload into a DocumentBlob and hand the document's
+    pages and chunks to it (duplicates keep the first extraction only).
+    A document whose file is missing from storage gets a file-less blob
+    keyed on its text: that text is the only copy left since
+    Document.content was dropped.
+    """
+    Document = apps.get_model('groups', 'Document')
+    DocumentBlob = apps.get_model('groups', 'DocumentBlob')
+    DocumentPage = apps.get_model('pramiti_ai', 'DocumentPage')
+    DocumentChunk = apps.get_model('pramiti_ai', 'DocumentChunk')
+
+    for document in Document.objects.filter(blob__isnull=True).iterator(chunk_size=50):
+        name = document.file.name
+        text = _stored_text(DocumentPage, document.id)
+        if name and default_storage.exists(name):
+            hasher = hashlib.sha256()
+            size = 0
+            with default_storage.open(name, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+                    size += len(chunk)
+
+            blob, _ = DocumentBlob.objects.get_or_create(
+                sha256=hasher.hexdigest(),
+                defaults={'file': name, 'size': size},
+            )
+            Document.objects.filter(id=document.id).update(blob=blob, file=blob.file.name)
+            if document.extraction_status != 'done':
+                continue
+        elif text is not None:
+            blob, _ = DocumentBlob.objects.get_or_create(
+                sha256=document.content_hash or hashlib.sha256(text.encode('utf-8')).hexdigest(),
+                defaults={'file': '', 'size': 0},
+            )
+            Document.objects.filter(id=document.id).update(blob=blob, extraction_status='done')
+        else:
+            # no file and no text: nothing to keep
+            continue
+
+        if blob.extracted_at is None:
+            pages = DocumentPage.objects.filter(document_id=document.id)
+            page_count = pages.count()
+            text_length = max(pages.values_list('end_offset', flat=True), default=0)
+            text_hash = document.content_hash or (hashlib.sha256(text.encode('utf-8')).hexdigest() if text else '')
+            pages.update(blob=blob)
+            DocumentChunk.objects.filter(document_id=document.id).update(blob=blob)
+            DocumentBlob.objects.filter(id=blob.id).update(
+                page_count=page_count,
+                text_length=text_length,
+                text_hash=text_hash,
+                extracted_at=timezone.now(),
+            )
+            Document.objects.filter(id=document.id).update(
+                page_count=page_count, text_length=text_length, content_hash=text_hash,
+            )
+
+    # Rows of duplicate uploads, whose blob kept the first extraction
+    DocumentPage.objects.filter(blob__isnull=True).delete()
+    DocumentChunk.objects.filter(blob__isnull=True).delete()
+
+
+def move_to_documents(apps, schema_editor):
+    """
+    Give every document its blob's pages and chunks back. Documents keep
+    their blob, and duplicate uploads keep pointing at the shared file.
+    """
+    Document = apps.get_model('groups', 'Document')
+    DocumentBlob = apps.get_model('groups', 'DocumentBlob')
+    DocumentPage = apps.get_model('pramiti_ai', 'DocumentPage')
+    DocumentChunk = apps.get_model('pramiti_ai', 'DocumentChunk')
+
+    for blob in DocumentBlob.objects.iterator():
+        document_ids = list(Document.objects.filter(blob=blob).order_by('id').values_list('id', flat=True))
+        pages = DocumentPage.objects.filter(blob=blob)
+        chunks = DocumentChunk.objects.filter(blob=blob)
+        if not document_ids:
+            pages.delete()
+            chunks.delete()
+            continue
+
+        for document_id in document_ids[1:]:
+            DocumentPage.objects.bulk_create([
+                DocumentPage(
+                    document_id=document_id,
+                    page_number=page.page_number,
+                    text=page.text,
+                    start_offset=page.start_offset,
+                    end_offset=page.end_offset,
+                )
+                for page in pages
+            ])
+            DocumentChunk.objects.bulk_create([
+                DocumentChunk(
+                    document_id=document_id,
+                    index=chunk.index,
+                    text=chunk.text,
+                    token_count=chunk.token_count,
+                    term_freqs=chunk.term_freqs,
+                )
+                for chunk in chunks
+            ])
+        pages.update(document_id=document_ids[0])
+        chunks.update(document_id=document_ids[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0008_documentblob'),
+        ('pramiti_ai', '0008_documentpage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentpage',
+            name='blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='groups.documentblob'),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='groups.documentblob'),
+        ),
+        migrations.AlterField(
+            model_name='documentpage',
+            name='document',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='groups.document'),
+        ),
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='document',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='groups.document'),
+        ),
+        migrations.RunPython(move_to_blobs, move_to_documents),
+        migrations.AlterModelOptions(
+            name='documentpage',
+            options={'ordering': ['blob', 'page_number']},
+        ),
+        migrations.AlterModelOptions(
+            name='documentchunk',
+            options={'ordering': ['blob', 'index']},
+        ),
+        migrations.AlterUniqueTogether(
+            name='documentpage',
+            unique_together={('blob', 'page_number')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='documentchunk',
+            unique_together={('blob', 'index')},
+        ),
+        migrations.RemoveField(
+            model_name='documentpage',
+            name='document',
+        ),
+        migrations.RemoveField(
+            model_name='documentchunk',
+            name='document',
+        ),
+        migrations.AlterField(
+            model_name='documentpage',
+            name='blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='groups.documentblob'),
+        ),
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='groups.documentblob'),
+        ),
+    ]
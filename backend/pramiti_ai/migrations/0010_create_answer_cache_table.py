@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:20
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_tables(apps, schema_editor):
+    """
+    The answer cache defaults to the database; createcachetable skips
+    tables that exist and caches that aren't DatabaseCache
+    """
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pramiti_ai', '0009_move_pages_and_chunks_to_blob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pramiti_ai', '0010_create_answer_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiquestion',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aiquestion',
+            name='retry_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -8,6 +8,8 @@ from groups.models import Group, Document  # keep this import for foreign keys
 # =======================
 class AIQuestion(models.Model):
     STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
         ('answered', 'Answered'),
         ('failed', 'Failed'),
         ('regenerated', 'Regenerated'),
@@ -41,7 +43,9 @@ class AIQuestion(models.Model):
     answer = models.TextField(blank=True)
     topic = models.CharField(max_length=100, blank=True, null=True)
     ai_model = models.CharField(max_length=100, default='gpt-4')
-    tokens_used = models.PositiveIntegerField(null=True, blank=True)
+    tokens_used = models.PositiveIntegerField(null=True, blank=True)  # prompt + completion
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
     response_time_ms = models.PositiveIntegerField(null=True, blank=True)
 
     confidence_score = models.DecimalField(
@@ -63,9 +67,20 @@ class AIQuestion(models.Model):
         default='group'
     )
 
+    served_from_cache = models.BooleanField(default=False)
+
     asked_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # set when a worker picks up an async question
+    # async questions whose document wasn't extracted yet are retried with backoff
+    retry_count = models.PositiveSmallIntegerField(default=0)
+    not_before = models.DateTimeField(null=True, blank=True)
     answered_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'asked_at']),  # worker queue scan
+        ]
+
     def __str__(self):
         return f"{self.user} | {self.question[:40]}"
 
@@ -73,7 +88,7 @@ class AIQuestion(models.Model):
 # models.py
 from django.db import models
 from django.conf import settings  # <- important
-from groups.models import Document
+from groups.models import Document, DocumentBlob
 
 class DocumentNote(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -86,3 +101,48 @@ class DocumentNote(models.Model):
 
 
 
+
+
+# =======================
+# Document Page (extracted text)
+# =======================
+class DocumentPage(models.Model):
+    blob = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.CASCADE,
+        related_name='pages'
+    )
+    page_number = models.PositiveIntegerField()
+    text = models.TextField(blank=True)
+    # Position of this page in the document text (pages joined with "\n")
+    start_offset = models.PositiveIntegerField()
+    end_offset = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('blob', 'page_number')
+        ordering = ['blob', 'page_number']
+
+    def __str__(self):
+        return f"{self.blob} p.{self.page_number}"
+
+
+# =======================
+# Document Chunk (retrieval index)
+# =======================
+class DocumentChunk(models.Model):
+    blob = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.CASCADE,
+        related_name='chunks'
+    )
+    index = models.PositiveIntegerField()
+    text = models.TextField()
+    token_count = models.PositiveIntegerField(default=0)
+    term_freqs = models.JSONField(default=dict, blank=True)  # term -> count, used by the BM25 index
+
+    class Meta:
+        unique_together = ('blob', 'index')
+        ordering = ['blob', 'index']
+
+    def __str__(self):
+        return f"{self.blob} #{self.index}"
@@ -1,3 +1,738 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import os
+import tempfile
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import pypdfium2 as pdfium
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Organization, User
+from pramiti_ai.models import AIQuestion, DocumentPage
+from groups.models import Document, DocumentBlob, Group
+from groups.utils.uploads import get_or_create_blob
+from pramiti_ai.utils.extraction import (
+    ExtractionFailedError, ExtractionPendingError, extract_blob, extract_document, save_pages, schedule_extraction,
+    wait_for_extraction,
+)
+from pramiti_ai.utils.ai_service import LLMProvider, LLMResponse, StubProvider, get_provider
+from pramiti_ai.utils.ask import (
+    AnswerStreamFilter, answer_question, answer_questions_batch, in_flight, parse_batch_answers,
+)
+from pramiti_ai.utils.jobs import claim_next_question, process_question, run_worker
+from pramiti_ai.utils import pdf, retrieval
+from pramiti_ai.utils.answer_cache import (
+    CACHE_ALIAS, get_cached_answer, invalidate_document, make_key, normalize_question, store_answer,
+)
+from pramiti_ai.utils.retrieval import ChunkIndex, select_context, split_into_chunks, tokenize
+from pramiti_ai.utils.tokens import PromptTooLargeError, context_token_budget, get_prompt_token_budget
+
+
+def make_organization(**extra):
+    return Organization.objects.create_user(
+        email="org@example.com",
+        password="secret",
+        admin_name="Admin",
+        designation="HR",
+        phone_number="1",
+        organization_name="Acme",
+        industry="IT",
+        organization_size=10,
+        registration_id="R1",
+        **extra,
+    )
+
+
+def make_document(page_texts, group=None, sha256="a" * 64):
+    """
+    An extracted document whose blob has the given page texts
+    """
+    # row ids are reused after each test's rollback, so don't trust cached indexes
+    retrieval._index_cache.clear()
+    group = group or Group.objects.create(name="Group")
+    blob = DocumentBlob.objects.create(sha256=sha256, file=f"document_blobs/{sha256}.pdf")
+    blob = save_pages(blob, page_texts)
+    return Document.objects.create(
+        group=group,
+        title="Doc",
+        file=blob.file.name,
+        blob=blob,
+        page_count=blob.page_count,
+        text_length=blob.text_length,
+        content_hash=blob.text_hash,
+        extraction_status="done",
+    )
+
+
+class RetrievalTests(TestCase):
+    def test_chunks_overlap(self):
+        words = " ".join(str(i) for i in range(10))
+        self.assertEqual(split_into_chunks(words, size=4, overlap=1), ["0 1 2 3", "3 4 5 6", "6 7 8 9"])
+
+    def test_bm25_prefers_rarer_and_denser_terms(self):
+        texts = [
+            "holiday calendar and office hours",
+            "leave policy: annual leave is twenty days of leave",
+            "office parking and office security",
+        ]
+        index = ChunkIndex([(i, text, 5, {t: tokenize(text).count(t) for t in tokenize(text)}) for i, text in enumerate(texts)])
+
+        self.assertEqual([pos for pos, _ in index.search("How many days of annual leave?")][0], 1)
+        self.assertEqual([pos for pos, _ in index.search("office")], [2, 0])
+        self.assertEqual(index.search("unrelated"), [])
+
+    @override_settings(AI_CHUNK_SIZE_WORDS=6, AI_CHUNK_OVERLAP_WORDS=0)
+    def test_select_context_keeps_relevant_chunks_in_document_order(self):
+        document = make_document([
+            # six words per page, so each page is one chunk
+            "intro words about the company history",
+            "expense claims are reimbursed monthly finance",
+            "the dress code is business casual",
+            "expense receipts must accompany all claims",
+        ])
+
+        context = select_context(document, "How are expense claims reimbursed?", top_k=2)
+
+        self.assertIn("reimbursed monthly", context)
+        self.assertIn("receipts must accompany", context)
+        self.assertNotIn("dress code", context)
+        self.assertLess(context.index("reimbursed"), context.index("receipts"))
+
+    @override_settings(AI_CHUNK_SIZE_WORDS=6, AI_CHUNK_OVERLAP_WORDS=0)
+    def test_select_context_respects_token_budget(self):
+        document = make_document(["alpha beta gamma delta epsilon zeta " * 4])
+
+        context = select_context(document, "nothing matches", token_budget=12)
+
+        # falls back to the start of the document, as much as fits
+        self.assertTrue(context.startswith("alpha beta"))
+        self.assertLessEqual(len(context) // 4, 12)
+
+
+class PageStoreTests(TestCase):
+    def setUp(self):
+        self.blob = DocumentBlob.objects.create(sha256="a" * 64, file="document_blobs/a.pdf")
+
+    def test_offsets_index_the_joined_text(self):
+        blob = save_pages(self.blob, ["  Hello ", None, "", "World"])
+        text = "Hello\nWorld"
+
+        pages = list(DocumentPage.objects.filter(blob=blob).order_by("page_number"))
+        self.assertEqual([p.page_number for p in pages], [1, 2, 3, 4])
+        self.assertEqual([(p.start_offset, p.end_offset) for p in pages], [(0, 5), (5, 5), (5, 5), (6, 11)])
+        for page in pages:
+            self.assertEqual(text[page.start_offset:page.end_offset], page.text)
+
+        self.assertEqual((blob.page_count, blob.text_length), (4, len(text)))
+        self.assertEqual(blob.text_hash, hashlib.sha256(text.encode("utf-8")).hexdigest())
+        self.assertIsNotNone(blob.extracted_at)
+
+    def test_empty_document_has_no_hash(self):
+        blob = save_pages(self.blob, ["", "  "])
+        self.assertEqual((blob.page_count, blob.text_length, blob.text_hash), (2, 0, ""))
+
+    def test_first_finished_extraction_wins(self):
+        save_pages(self.blob, ["First"])
+        blob = save_pages(self.blob, ["Second", "run"])
+        self.assertEqual(blob.page_count, 1)
+        self.assertEqual(list(DocumentPage.objects.filter(blob=blob).values_list("text", flat=True)), ["First"])
+
+
+class BlobMigrationTests(TransactionTestCase):
+    before = [("pramiti_ai", "0008_documentpage"), ("groups", "0008_documentblob")]
+    after = [("pramiti_ai", "0009_move_pages_and_chunks_to_blob")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_documents_without_a_file_keep_their_text(self):
+        apps = self.migrate(self.before)
+        Group = apps.get_model("groups", "Group")
+        Document = apps.get_model("groups", "Document")
+        DocumentPage = apps.get_model("pramiti_ai", "DocumentPage")
+        text = "The leave policy allows twenty days."
+        document = Document.objects.create(
+            group=Group.objects.create(name="Group"), title="Doc", file="group_documents/gone.pdf",
+            extraction_status="done", page_count=1, text_length=len(text),
+            content_hash=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        )
+        DocumentPage.objects.create(document=document, page_number=1, text=text, start_offset=0, end_offset=len(text))
+
+        apps = self.migrate(self.after)
+        document = apps.get_model("groups", "Document").objects.get(id=document.id)
+        blob = apps.get_model("groups", "DocumentBlob").objects.get(id=document.blob_id)
+
+        self.assertEqual(document.extraction_status, "done")
+        self.assertEqual((document.page_count, document.text_length), (1, len(text)))
+        self.assertEqual((blob.file.name, blob.sha256, blob.text_hash), ("", document.content_hash, document.content_hash))
+        self.assertIsNotNone(blob.extracted_at)
+        self.assertEqual(list(apps.get_model("pramiti_ai", "DocumentPage").objects.filter(blob=blob).values_list("text", flat=True)), [text])
+
+        # and back
+        apps = self.migrate(self.before)
+        self.assertEqual(apps.get_model("pramiti_ai", "DocumentPage").objects.get().document_id, document.id)
+
+
+def write_blank_pdf(path, pages):
+    document = pdfium.PdfDocument.new()
+    for _ in range(pages):
+        document.new_page(200, 300)
+    document.save(path)
+    document.close()
+
+
+class RecordingExecutor:
+    """
+    Runs tasks inline, remembering what was submitted
+    """
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append(fn)
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class PdfTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "doc.pdf")
+        write_blank_pdf(self.path, 3)
+
+    def test_all_parsing_runs_in_the_executor(self):
+        executor = RecordingExecutor()
+        with mock.patch.object(pdf, "PAGES_PER_TASK", 2):
+            self.assertEqual(pdf.extract_pages(self.path, executor=executor), ["", "", ""])
+        self.assertEqual(executor.calls, [pdf.page_count, pdf.extract_page_range, pdf.extract_page_range])
+
+    def test_small_documents_too(self):
+        executor = RecordingExecutor()
+        pdf.extract_pages(self.path, executor=executor)
+        self.assertEqual(executor.calls, [pdf.page_count, pdf.extract_page_range])
+
+    def test_without_executor_calls_are_serialized(self):
+        self.assertTrue(pdf.run_pdf_task(None, pdf._pdfium_lock.locked))
+        self.assertFalse(pdf._pdfium_lock.locked())
+        with mock.patch.object(pdf, "page_count", side_effect=lambda path: pdf._pdfium_lock.locked() and 3):
+            self.assertEqual(len(pdf.extract_pages(self.path)), 3)
+
+
+@mock.patch("pramiti_ai.utils.extraction._process_pool", return_value=None)
+class ExtractBlobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.group = Group.objects.create(name="Group")
+
+    def upload(self, content, name="doc.pdf"):
+        return get_or_create_blob(SimpleUploadedFile(name, content))
+
+    def pdf_bytes(self, pages):
+        path = os.path.join(settings.MEDIA_ROOT, "source.pdf")
+        write_blank_pdf(path, pages)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def add_document(self, blob):
+        return Document.objects.create(group=self.group, title="Doc", file=blob.file.name, blob=blob)
+
+    def test_identical_uploads_share_a_blob(self, _):
+        content = self.pdf_bytes(3)
+        blob, created = self.upload(content)
+        again, created_again = self.upload(content, name="copy.pdf")
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again, blob)
+        self.assertEqual(len(os.listdir(os.path.dirname(blob.file.path))), 1)
+
+    def test_extracted_blob_is_linked_without_parsing(self, _):
+        blob, _ = self.upload(self.pdf_bytes(3))
+        extract_blob(blob)
+        blob.refresh_from_db()
+
+        document = self.add_document(blob)
+        with mock.patch("pramiti_ai.utils.extraction.extract_pages") as extract_pages, \
+                mock.patch("pramiti_ai.utils.extraction.run_in_pool") as run_in_pool:
+            schedule_extraction(document)
+
+        extract_pages.assert_not_called()
+        run_in_pool.assert_not_called()
+        self.assertEqual((document.extraction_status, document.page_count), ("done", 3))
+
+    def test_unreadable_pdf_is_extracted_as_empty(self, _):
+        blob, _ = self.upload(b"not a pdf")
+        blob = extract_blob(blob)
+        self.assertEqual(blob.page_count, 0)
+        self.assertIsNotNone(blob.extracted_at)
+
+    def test_other_errors_leave_the_blob_to_be_retried(self, _):
+        blob, _ = self.upload(self.pdf_bytes(1))
+        document = self.add_document(blob)
+        os.remove(blob.file.path)
+
+        with self.assertRaises(FileNotFoundError):
+            extract_document(document.id)
+
+        blob.refresh_from_db()
+        document.refresh_from_db()
+        self.assertIsNone(blob.extracted_at)
+        self.assertEqual(document.extraction_status, "failed")
+
+
+@override_settings(AI_ORG_PROMPT_TOKEN_BUDGET=1000, AI_CONTEXT_TOKEN_BUDGET=4000)
+class TokenBudgetTests(TestCase):
+    def test_organization_budget_overrides_the_default(self):
+        self.assertEqual(get_prompt_token_budget(None), 1000)
+        self.assertEqual(get_prompt_token_budget(make_organization(ai_prompt_token_budget=100)), 100)
+
+    def test_context_gets_what_the_fixed_text_leaves(self):
+        organization = make_organization(ai_prompt_token_budget=100)
+        self.assertEqual(context_token_budget(organization, "x" * 40), 90)
+
+    def test_prompts_over_budget_are_rejected(self):
+        organization = make_organization(ai_prompt_token_budget=100)
+        with self.assertRaises(PromptTooLargeError):
+            context_token_budget(organization, "x" * 400)
+
+    @override_settings(AI_PROVIDER_BACKEND="stub", AI_STUB_LATENCY_MS=0)
+    def test_batch_endpoint_rejects_oversized_questions(self):
+        organization = make_organization(ai_prompt_token_budget=50)
+        document = make_document(["Text."], group=Group.objects.create(name="Group", organization=organization))
+        user = User.objects.create_user("reader@example.com", "secret")
+        user.is_active = True
+        user.save()
+        refresh = RefreshToken.for_user(user)
+        refresh["user_type"] = "user"
+
+        response = self.client.post(
+            f"/api/documents/{document.id}/ask-ai/batch/",
+            {"questions": ["word " * 200], "group_id": document.group_id},
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {refresh.access_token}"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("token budget", response.data["error"])
+        self.assertFalse(AIQuestion.objects.exists())
+
+
+@override_settings(PDF_EXTRACTION_WAIT_SECONDS=0)
+class ExtractionWaitTests(TestCase):
+    def setUp(self):
+        self.document = make_document(["Text."])
+        self.document.extraction_status = "pending"
+        self.document.save()
+
+    def test_queues_pending_documents_instead_of_extracting_them(self):
+        with mock.patch("pramiti_ai.utils.extraction.submit_to") as submit_to, \
+                mock.patch("pramiti_ai.utils.extraction.time.sleep"):
+            with self.assertRaisesMessage(ExtractionPendingError, "still being processed"):
+                wait_for_extraction(self.document)
+
+        submit_to.assert_called_once_with("extraction", extract_document, self.document.id)
+
+    def test_failing_again_after_requeue_gives_up(self):
+        Document.objects.filter(id=self.document.id).update(extraction_status="failed")
+        self.document.refresh_from_db()
+
+        def extraction_fails(*args):
+            self.assertEqual(Document.objects.get(id=self.document.id).extraction_status, "pending")
+            Document.objects.filter(id=self.document.id).update(extraction_status="failed")
+
+        with mock.patch("pramiti_ai.utils.extraction.submit_to", side_effect=extraction_fails) as submit_to, \
+                mock.patch("pramiti_ai.utils.extraction.time.sleep"):
+            with self.assertRaisesMessage(ExtractionPendingError, "could not be processed"):
+                wait_for_extraction(self.document, timeout=60)
+        submit_to.assert_called_once()
+
+    @override_settings(PDF_EXTRACTION_TIMEOUT_SECONDS=60)
+    def test_stale_processing_extraction_is_requeued(self):
+        Document.objects.filter(id=self.document.id).update(
+            extraction_status="processing", extraction_started_at=timezone.now() - timedelta(seconds=90)
+        )
+        self.document.refresh_from_db()
+
+        with mock.patch("pramiti_ai.utils.extraction.submit_to") as submit_to, \
+                mock.patch("pramiti_ai.utils.extraction.time.sleep"):
+            with self.assertRaises(ExtractionPendingError):
+                wait_for_extraction(self.document)
+        submit_to.assert_called_once_with("extraction", extract_document, self.document.id)
+
+    @override_settings(PDF_EXTRACTION_TIMEOUT_SECONDS=60)
+    def test_running_extraction_is_not_requeued(self):
+        Document.objects.filter(id=self.document.id).update(
+            extraction_status="processing", extraction_started_at=timezone.now() - timedelta(seconds=30)
+        )
+        self.document.refresh_from_db()
+
+        with mock.patch("pramiti_ai.utils.extraction.submit_to") as submit_to, \
+                mock.patch("pramiti_ai.utils.extraction.time.sleep"):
+            with self.assertRaises(ExtractionPendingError):
+                wait_for_extraction(self.document)
+        submit_to.assert_not_called()
+
+    def test_finished_extraction_is_reused(self):
+        self.document.extraction_status = "done"
+        with mock.patch("pramiti_ai.utils.extraction.submit_to") as submit_to:
+            wait_for_extraction(self.document)
+        submit_to.assert_not_called()
+
+    def test_ask_endpoint_answers_503_while_pending(self):
+        user = User.objects.create_user("reader@example.com", "secret")
+        user.is_active = True
+        user.save()
+        refresh = RefreshToken.for_user(user)
+        refresh["user_type"] = "user"
+
+        with mock.patch("pramiti_ai.utils.extraction.submit_to"), \
+                mock.patch("pramiti_ai.utils.extraction.time.sleep"):
+            response = self.client.post(
+                f"/api/documents/{self.document.id}/ask-ai/",
+                {"question": "Text?", "group_id": self.document.group_id},
+                content_type="application/json",
+                headers={"Authorization": f"Bearer {refresh.access_token}"},
+            )
+        self.assertEqual(response.status_code, 503)
+
+
+class AnswerCacheTests(TestCase):
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+        self.document = make_document(["The leave policy allows twenty days."])
+
+    def test_normalized_questions_share_an_entry(self):
+        self.assertEqual(normalize_question("  What is the  LEAVE policy?? "), "what is the leave policy")
+        store_answer(self.document, "What is the leave policy?", "Twenty days", "Leave", "stub")
+
+        cached = get_cached_answer(self.document, "what is the leave   policy")
+        self.assertEqual(cached, {"answer": "Twenty days", "topic": "Leave", "ai_model": "stub"})
+
+    def test_invalidation_drops_answers(self):
+        store_answer(self.document, "Leave?", "Twenty days", "Leave", "stub")
+        invalidate_document(self.document.id)
+        self.assertIsNone(get_cached_answer(self.document, "Leave?"))
+
+    def test_new_content_or_version_misses(self):
+        store_answer(self.document, "Leave?", "Twenty days", "Leave", "stub")
+
+        self.document.content_hash = "b" * 64
+        self.assertIsNone(get_cached_answer(self.document, "Leave?"))
+
+        self.document.refresh_from_db()
+        self.document.version = "2.0"
+        self.assertIsNone(get_cached_answer(self.document, "Leave?"))
+
+    def test_other_documents_are_untouched(self):
+        other = make_document(["Other text."], group=self.document.group, sha256="c" * 64)
+        store_answer(other, "Leave?", "Ten days", "Leave", "stub")
+
+        invalidate_document(self.document.id)
+        self.assertEqual(get_cached_answer(other, "Leave?")["answer"], "Ten days")
+
+
+@override_settings(AI_PROVIDER_BACKEND="stub", AI_STUB_LATENCY_MS=0)
+class QuestionQueueTests(TestCase):
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+        self.user = User.objects.create_user("reader@example.com", "secret")
+        self.document = make_document(["The leave policy allows twenty days."])
+
+    def ask(self, question, status="pending"):
+        return AIQuestion.objects.create(
+            user=self.user, document=self.document, group=self.document.group, question=question, status=status
+        )
+
+    def test_claims_oldest_pending_once(self):
+        first, second = self.ask("One?"), self.ask("Two?")
+        self.ask("Done?", status="answered")
+
+        claimed = claim_next_question()
+        self.assertEqual(claimed, first)
+        self.assertEqual(claimed.status, "processing")
+        self.assertIsNotNone(claimed.claimed_at)
+        self.assertEqual(claim_next_question(), second)
+        self.assertIsNone(claim_next_question())
+
+    @override_settings(AI_JOB_TIMEOUT_SECONDS=60)
+    def test_reclaims_questions_of_dead_workers(self):
+        question = self.ask("One?", status="processing")
+        AIQuestion.objects.filter(id=question.id).update(claimed_at=timezone.now() - timedelta(seconds=30))
+        self.assertIsNone(claim_next_question())
+
+        AIQuestion.objects.filter(id=question.id).update(claimed_at=timezone.now() - timedelta(seconds=90))
+        self.assertEqual(claim_next_question(), question)
+
+    @override_settings(AI_JOB_RETRY_SECONDS=60)
+    def test_pending_extraction_requeues_the_question(self):
+        question = self.ask("One?")
+        claimed = claim_next_question()
+
+        with mock.patch("pramiti_ai.utils.jobs.answer_question", side_effect=ExtractionPendingError):
+            process_question(claimed)
+        question.refresh_from_db()
+        self.assertEqual(question.status, "pending")
+        self.assertEqual(question.retry_count, 1)
+        self.assertGreater(question.not_before, timezone.now())
+
+        # Backed off: newer questions are claimed first
+        other = self.ask("Two?")
+        self.assertEqual(claim_next_question(), other)
+        self.assertIsNone(claim_next_question())
+
+        AIQuestion.objects.filter(id=question.id).update(not_before=timezone.now())
+        run_worker(burst=True)
+        question.refresh_from_db()
+        self.assertEqual(question.status, "answered")
+        self.assertTrue(question.answer.startswith("Stub answer"))
+
+    def test_failed_extraction_fails_the_question(self):
+        self.ask("One?")
+        claimed = claim_next_question()
+        with mock.patch("pramiti_ai.utils.jobs.answer_question", side_effect=ExtractionFailedError), \
+                self.assertLogs("pramiti_ai.utils.jobs"):
+            process_question(claimed)
+        self.assertEqual(AIQuestion.objects.get().status, "failed")
+
+    @override_settings(AI_JOB_MAX_RETRIES=2)
+    def test_gives_up_after_max_retries(self):
+        question = self.ask("One?")
+        AIQuestion.objects.filter(id=question.id).update(retry_count=2)
+        with mock.patch("pramiti_ai.utils.jobs.answer_question", side_effect=ExtractionPendingError), \
+                self.assertLogs("pramiti_ai.utils.jobs"):
+            process_question(claim_next_question())
+        self.assertEqual(AIQuestion.objects.get().status, "failed")
+
+    def test_errors_fail_the_question(self):
+        self.ask("One?")
+        with mock.patch("pramiti_ai.utils.jobs.answer_question", side_effect=RuntimeError("boom")), \
+                self.assertLogs("pramiti_ai.utils.jobs"):
+            run_worker(burst=True)
+        self.assertEqual(AIQuestion.objects.get().status, "failed")
+
+
+class BatchAnswerTests(TestCase):
+    def test_parses_numbered_blocks(self):
+        raw = "QUESTION 1:\nANSWER:\nTwenty days\nTOPIC:\nLeave\n\nQUESTION 2:\nANSWER:\nMonthly\nTOPIC:\nFinance"
+        self.assertEqual(parse_batch_answers(raw, 2), {1: ("Twenty days", "Leave"), 2: ("Monthly", "Finance")})
+
+    def test_malformed_blocks_are_skipped(self):
+        raw = (
+            "Sure! Here are the answers.\n"
+            "QUESTION 2:\nANSWER:\nMonthly\nTOPIC:\nFinance\n"
+            "QUESTION 2:\nANSWER:\nDuplicate\nTOPIC:\nX\n"
+            "QUESTION 7:\nANSWER:\nOut of range\nTOPIC:\nX\n"
+            "QUESTION 0:\nANSWER:\nOut of range\nTOPIC:\nX"
+        )
+        self.assertEqual(parse_batch_answers(raw, 3), {2: ("Monthly", "Finance")})
+
+    def test_reply_without_markers_answers_nothing(self):
+        self.assertEqual(parse_batch_answers("I cannot answer these questions.", 2), {})
+
+    def test_unanswered_questions_fail(self):
+        user = User.objects.create_user("reader@example.com", "secret")
+        document = make_document(["The leave policy allows twenty days."])
+        reply = LLMResponse("QUESTION 2:\nANSWER:\nMonthly\nTOPIC:\nFinance", "stub", 10, 4)
+
+        with mock.patch("pramiti_ai.utils.ask.get_provider") as get_provider_mock:
+            get_provider_mock.return_value.generate.return_value = reply
+            first, second = answer_questions_batch(user, document, document.group, ["Leave?", "Expenses?"])
+
+        self.assertEqual(first.status, "failed")
+        self.assertEqual((second.status, second.answer, second.topic), ("answered", "Monthly", "Finance"))
+        # nothing was cached for the failed one
+        self.assertIsNone(get_cached_answer(document, "Leave?"))
+
+
+@override_settings(AI_PROVIDER_BACKEND="stub", AI_STUB_LATENCY_MS=0, AI_SINGLEFLIGHT_POLL_SECONDS=0)
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+        self.user = User.objects.create_user("reader@example.com", "secret")
+        self.document = make_document(["The leave policy allows twenty days."])
+
+    def ask(self, question):
+        return AIQuestion.objects.create(
+            user=self.user, document=self.document, group=self.document.group, question=question
+        )
+
+    def test_waits_for_the_answer_of_another_process(self):
+        # the lease is held elsewhere, which stores its answer while we poll
+        lease = in_flight.try_lead(make_key(self.document, "Leave?"))
+        self.assertTrue(lease)
+
+        def other_process_finishes(seconds):
+            store_answer(self.document, "Leave?", "Twenty days", "Leave", "other")
+
+        with mock.patch("pramiti_ai.utils.singleflight.time.sleep", side_effect=other_process_finishes), \
+                mock.patch("pramiti_ai.utils.ask.get_provider") as get_provider_mock:
+            question = answer_question(self.ask("leave?"))
+
+        get_provider_mock.assert_not_called()
+        self.assertTrue(question.served_from_cache)
+        self.assertEqual((question.answer, question.ai_model), ("Twenty days", "other"))
+
+    def test_generates_itself_when_the_leader_gives_up(self):
+        key = make_key(self.document, "Leave?")
+        lease = in_flight.try_lead(key)
+
+        with mock.patch("pramiti_ai.utils.singleflight.time.sleep", side_effect=lambda _: in_flight.release(key, lease)):
+            question = answer_question(self.ask("Leave?"))
+
+        self.assertFalse(question.served_from_cache)
+        self.assertTrue(question.answer.startswith("Stub answer"))
+        # and the lease is free again
+        self.assertTrue(in_flight.try_lead(key))
+
+    def test_batch_generates_duplicate_questions_once(self):
+        reply = LLMResponse("QUESTION 1:\nANSWER:\nTwenty days\nTOPIC:\nLeave", "stub", 10, 4)
+        with mock.patch("pramiti_ai.utils.ask.get_provider") as get_provider_mock:
+            get_provider_mock.return_value.generate.return_value = reply
+            first, second = answer_questions_batch(
+                self.user, self.document, self.document.group, ["Leave?", "leave ?"]
+            )
+
+        get_provider_mock.return_value.generate.assert_called_once()
+        self.assertEqual((first.answer, second.answer), ("Twenty days", "Twenty days"))
+        self.assertEqual((first.served_from_cache, second.served_from_cache), (False, True))
+        self.assertTrue(in_flight.try_lead(make_key(self.document, "Leave?")))
+
+
+class AnswerStreamTests(TestCase):
+    def feed_all(self, pieces):
+        stream_filter = AnswerStreamFilter()
+        return [stream_filter.feed(piece) for piece in pieces], stream_filter
+
+    def test_markers_split_across_pieces_never_leak(self):
+        deltas, stream_filter = self.feed_all(["AN", "SWER:\nHel", "lo wor", "ld.\n\nTO", "PIC:\nLeave"])
+
+        self.assertEqual("".join(deltas).strip(), "Hello world.")
+        self.assertNotIn("TO", "".join(deltas))
+        self.assertEqual(stream_filter.raw, "ANSWER:\nHello world.\n\nTOPIC:\nLeave")
+
+    def test_one_character_at_a_time(self):
+        deltas, _ = self.feed_all("ANSWER: Hi there TOPIC: x")
+        self.assertEqual("".join(deltas).strip(), "Hi there")
+
+    def test_reply_without_markers_is_streamed(self):
+        deltas, _ = self.feed_all(["Just ", "an answer", " with no topic"])
+        # everything but a possible partial "TOPIC:" tail
+        self.assertTrue("Just an answer with no topic".startswith("".join(deltas)))
+        self.assertGreater(len("".join(deltas)), 20)
+
+    @override_settings(AI_PROVIDER_BACKEND="stub", AI_STUB_LATENCY_MS=0)
+    def test_stream_endpoint_sends_tokens_then_done(self):
+        caches[CACHE_ALIAS].clear()
+        user = User.objects.create_user("reader@example.com", "secret")
+        user.is_active = True
+        user.save()
+        refresh = RefreshToken.for_user(user)
+        refresh["user_type"] = "user"
+        document = make_document(["The leave policy allows twenty days."])
+
+        response = self.client.post(
+            f"/api/documents/{document.id}/ask-ai/stream/",
+            {"question": "Leave?", "group_id": document.group_id},
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {refresh.access_token}"},
+        )
+
+        async def read_body():
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        body = async_to_sync(read_body)().decode()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn("event: token", body)
+        self.assertIn("event: done", body)
+        self.assertNotIn("TOPIC", body.split("event: done")[0])
+        self.assertEqual(AIQuestion.objects.get().status, "answered")
+
+    @override_settings(AI_PROVIDER_BACKEND="stub", AI_STUB_LATENCY_MS=2000)
+    def test_disconnect_mid_stream_fails_the_question(self):
+        caches[CACHE_ALIAS].clear()
+        user = User.objects.create_user("reader@example.com", "secret")
+        user.is_active = True
+        user.save()
+        refresh = RefreshToken.for_user(user)
+        refresh["user_type"] = "user"
+        document = make_document(["The leave policy allows twenty days."])
+
+        response = self.client.post(
+            f"/api/documents/{document.id}/ask-ai/stream/",
+            {"question": "Leave?", "group_id": document.group_id},
+            content_type="application/json",
+            headers={"Authorization": f"Bearer {refresh.access_token}"},
+        )
+
+        async def disconnect_after_first_event():
+            chunks = []
+
+            async def read_body():
+                async for chunk in response.streaming_content:
+                    chunks.append(chunk)
+
+            # the ASGI handler cancels the response task when the client goes away
+            reading = asyncio.ensure_future(read_body())
+            while not chunks:
+                await asyncio.sleep(0.01)
+            reading.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await reading
+            return chunks[0]
+
+        self.assertIn(b"event: token", async_to_sync(disconnect_after_first_event)())
+        self.assertEqual(AIQuestion.objects.get().status, "failed")
+
+
+class IncompleteProvider(LLMProvider):
+    def generate(self, prompt):
+        return None
+
+
+class ProviderTests(TestCase):
+    def test_incomplete_provider_fails_when_built(self):
+        with self.assertRaises(TypeError):
+            IncompleteProvider("model")
+        with override_settings(AI_PROVIDER_BACKEND="pramiti_ai.tests.IncompleteProvider"):
+            with self.assertRaises(TypeError):
+                get_provider()
+
+    @override_settings(AI_PROVIDER_BACKEND="stub", AI_STUB_LATENCY_MS=0)
+    def test_stub_provider_is_deterministic(self):
+        provider = get_provider()
+        self.assertIsInstance(provider, StubProvider)
+        self.assertIs(get_provider(), provider)
+
+        first, second = provider.generate("prompt"), provider.generate("prompt")
+        self.assertEqual(first.text, second.text)
+        self.assertNotEqual(first.text, provider.generate("other prompt").text)
+        self.assertEqual(first.prompt_tokens, 2)
+
+        async def collect(usage):
+            return "".join([piece async for piece in provider.stream("prompt", usage)])
+
+        usage = {}
+        self.assertEqual(async_to_sync(collect)(usage), first.text)
+        self.assertEqual(usage["completion_tokens"], first.completion_tokens)
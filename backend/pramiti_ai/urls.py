@@ -3,8 +3,12 @@ from . import views
 
 urlpatterns = [
     path('documents/<int:document_id>/ask-ai/', views.AskAIQuestionAPIView.as_view(), name='ask-ai'),
+    path('documents/<int:document_id>/ask-ai/stream/', views.ask_ai_stream, name='ask-ai-stream'),
+    path('documents/<int:document_id>/ask-ai/batch/', views.AskAIQuestionBatchAPIView.as_view(), name='ask-ai-batch'),
+    path('ai-questions/<int:question_id>/', views.AIQuestionDetailView.as_view(), name='ai-question-detail'),
     path("documents/<int:doc_id>/history/", views.DocumentHistoryView.as_view(), name="document-history"),
     path('documents/<int:doc_id>/note/', views.DocumentNoteView.as_view(), name='document-note'),
     path("documents/<int:document_id>/qa/", views.DocumentAIQuestionsView.as_view(), name="document-qa"),
     path("documents/<int:document_id>/topics/", views.DocumentTopicsView.as_view(), name="document-topics"),
+    path("organization/ai-usage/", views.OrganizationAIUsageView.as_view(), name="organization-ai-usage"),
 ]
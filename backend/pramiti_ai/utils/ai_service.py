@@ -1,34 +1,149 @@
-from openai import OpenAI
+# pramiti_ai/utils/ai_service.py
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+import os
+import threading
+import time
 
-client = OpenAI(api_key="YOUR_API_KEY")
+from dotenv import load_dotenv
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
 
-def get_answer_and_topic(question: str):
-    prompt = f"""
-You are an AI assistant.
+from pramiti_ai.utils.tokens import estimate_tokens
 
-1. Answer the question clearly.
-2. Then give a short topic (1–3 words).
+# Load .env
+load_dotenv()
 
-Return strictly in this format:
 
-ANSWER:
-<answer here>
+class LLMResponse:
+    def __init__(self, text, model, prompt_tokens=None, completion_tokens=None):
+        self.text = text
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
 
-TOPIC:
-<topic here>
 
-Question:
-{question}
-"""
+# ---------------------------
+# Providers
+# ---------------------------
+class LLMProvider(ABC):
+    """
+    Interface every LLM backend implements; a backend missing a method
+    fails when it is instantiated
+    """
+    def __init__(self, model):
+        self.model = model
 
-    response = client.chat.completions.create(
-        model="gemini-2.5-flash",
-        messages=[{"role": "user", "content": prompt}],
-    )
+    @abstractmethod
+    def generate(self, prompt):
+        """
+        LLMResponse for the whole completion
+        """
 
-    content = response.choices[0].message.content
+    @abstractmethod
+    def stream(self, prompt, usage=None):
+        """
+        Async generator of text pieces as the model produces them.
+        Token counts are written into the optional `usage` dict at the end.
+        """
 
-    answer = content.split("TOPIC:")[0].replace("ANSWER:", "").strip()
-    topic = content.split("TOPIC:")[1].strip()
 
-    return answer, topic
+class GeminiProvider(LLMProvider):
+    def __init__(self, model):
+        super().__init__(model)
+        import google.generativeai as genai
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ImproperlyConfigured("❌ GEMINI_API_KEY not found in .env file")
+
+        # One configured client / model per process; its gRPC channel is reused across requests
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model)
+
+    @staticmethod
+    def _token_counts(usage_metadata):
+        if not usage_metadata:
+            return None, None
+        return usage_metadata.prompt_token_count, usage_metadata.candidates_token_count
+
+    def generate(self, prompt):
+        response = self._model.generate_content(prompt)
+        prompt_tokens, completion_tokens = self._token_counts(response.usage_metadata)
+        return LLMResponse(response.text, self.model, prompt_tokens, completion_tokens)
+
+    async def stream(self, prompt, usage=None):
+        response = await self._model.generate_content_async(prompt, stream=True)
+        usage_metadata = None
+        async for chunk in response:
+            usage_metadata = chunk.usage_metadata or usage_metadata
+            if chunk.parts:
+                yield chunk.text
+        if usage is not None:
+            usage["prompt_tokens"], usage["completion_tokens"] = self._token_counts(usage_metadata)
+
+
+class StubProvider(LLMProvider):
+    """
+    Deterministic offline backend for CI and load tests: the same prompt
+    always produces the same answer after AI_STUB_LATENCY_MS
+    """
+    def __init__(self, model, latency_ms=None):
+        super().__init__("stub")
+        self.latency_ms = settings.AI_STUB_LATENCY_MS if latency_ms is None else latency_ms
+
+    def _completion(self, prompt):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return f"ANSWER:\nStub answer {digest}.\n\nTOPIC:\nGeneral"
+
+    def generate(self, prompt):
+        time.sleep(self.latency_ms / 1000)
+        completion = self._completion(prompt)
+        return LLMResponse(completion, self.model, estimate_tokens(prompt), estimate_tokens(completion))
+
+    async def stream(self, prompt, usage=None):
+        completion = self._completion(prompt)
+        pieces = completion.split(" ")
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(self.latency_ms / 1000 / len(pieces))
+            yield piece if i == len(pieces) - 1 else piece + " "
+        if usage is not None:
+            usage["prompt_tokens"] = estimate_tokens(prompt)
+            usage["completion_tokens"] = estimate_tokens(completion)
+
+
+PROVIDER_ALIASES = {
+    "gemini": GeminiProvider,
+    "stub": StubProvider,
+}
+
+_provider = None
+_provider_pid = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """
+    Process-wide provider chosen by AI_PROVIDER_BACKEND (an alias or a dotted path).
+    Rebuilt after a fork so worker processes never share a parent's connections.
+    """
+    global _provider, _provider_pid
+    if _provider is None or _provider_pid != os.getpid():
+        with _provider_lock:
+            if _provider is None or _provider_pid != os.getpid():
+                backend = settings.AI_PROVIDER_BACKEND
+                provider_class = PROVIDER_ALIASES.get(backend) or import_string(backend)
+                _provider = provider_class(model=settings.AI_MODEL)
+                _provider_pid = os.getpid()
+    return _provider
+
+
+@receiver(setting_changed)
+def reset_provider(setting=None, **kwargs):
+    global _provider
+    if setting in (None, "AI_PROVIDER_BACKEND", "AI_MODEL", "AI_STUB_LATENCY_MS"):
+        _provider = None
@@ -0,0 +1,69 @@
+import hashlib
+import re
+import time
+
+from django.core.cache import caches
+
+from groups.models import Document
+from pramiti_ai.utils.retrieval import document_text
+
+# Dedicated cache alias (see CACHES in settings): LRU culling + TTL expiry
+CACHE_ALIAS = "ai_answers"
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def normalize_question(question):
+    """
+    Lowercase, collapse whitespace and drop trailing punctuation so that
+    "What is the leave policy?" and "what is the  leave policy" share an entry
+    """
+    return WHITESPACE_RE.sub(" ", (question or "").lower()).strip().rstrip("?!. ")
+
+
+def get_content_hash(document):
+    """
+    SHA-256 of the extracted text, computed once and stored on the document
+    """
+    if not document.content_hash and document.text_length and document.blob_id:
+        document.content_hash = hashlib.sha256(document_text(document.blob).encode("utf-8")).hexdigest()
+        Document.objects.filter(id=document.id).update(content_hash=document.content_hash)
+    return document.content_hash
+
+
+def _generation(document_id):
+    # Seeded with the current time so an evicted generation never
+    # resurrects answers cached before an invalidation
+    return _cache().get_or_set(f"gen:{document_id}", time.time_ns, timeout=None)
+
+
+def make_key(document, question):
+    normalized = normalize_question(question)
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return (
+        f"answer:{document.id}:{_generation(document.id)}:"
+        f"{get_content_hash(document)}:{document.version}:{digest}"
+    )
+
+
+def get_cached_answer(document, question):
+    return _cache().get(make_key(document, question))
+
+
+def store_answer(document, question, answer, topic, ai_model):
+    _cache().set(make_key(document, question), {
+        "answer": answer,
+        "topic": topic,
+        "ai_model": ai_model,
+    })
+
+
+def invalidate_document(document_id):
+    """
+    Drop every cached answer for a document (new upload / new version)
+    """
+    _cache().set(f"gen:{document_id}", time.time_ns(), timeout=None)
@@ -0,0 +1,344 @@
+# pramiti_ai/utils/ask.py
+import re
+import time
+from django.utils import timezone
+
+from groups.utils.stats import bump_group_stats, bump_document_stats
+from pramiti_ai.models import AIQuestion
+from pramiti_ai.utils.ai_service import get_provider
+from pramiti_ai.utils.extraction import wait_for_extraction
+from pramiti_ai.utils.retrieval import select_context, select_context_for_questions
+from pramiti_ai.utils.answer_cache import CACHE_ALIAS, get_cached_answer, store_answer, make_key
+from pramiti_ai.utils.singleflight import SingleFlight
+from pramiti_ai.utils.tokens import context_token_budget
+
+# Identical questions being generated right now, in any process; the
+# lease lives next to the answers in the shared answer cache
+in_flight = SingleFlight(CACHE_ALIAS)
+
+
+class UnreadableDocumentError(Exception):
+    pass
+
+
+PROMPT_TEMPLATE = """
+You are an AI assistant.
+
+Use the document excerpts below to answer the question.
+
+Rules:
+- Answer clearly
+- Give a SHORT topic (1–3 words)
+- No markdown
+- No bullets
+- Plain text only
+
+Return STRICTLY in this format:
+
+ANSWER:
+<answer here>
+
+TOPIC:
+<topic here>
+
+Document excerpts:
+{document_text}
+
+Question:
+{question_text}
+"""
+
+
+def ensure_document_text(document):
+    """
+    Make sure the document text has been extracted (normally done at upload)
+    """
+    wait_for_extraction(document)
+    if not document.text_length:
+        raise UnreadableDocumentError("This document is scanned or unreadable. AI cannot process it.")
+
+
+def parse_answer(raw_text):
+    raw_text = raw_text.strip()
+    if "TOPIC:" in raw_text:
+        answer_text = raw_text.split("TOPIC:")[0].replace("ANSWER:", "").strip()
+        topic_text = raw_text.split("TOPIC:")[1].strip()
+    else:
+        answer_text = raw_text
+        topic_text = "General"
+    return answer_text, topic_text
+
+
+def build_prompt(document, question_text, organization=None):
+    """
+    Prompt with only the chunks relevant to the question, trimmed to the
+    organization's prompt token budget
+    """
+    question_text = question_text or ""
+    token_budget = context_token_budget(
+        organization, PROMPT_TEMPLATE.format(document_text="", question_text=question_text)
+    )
+    document_text = select_context(document, question_text, token_budget=token_budget)
+    return PROMPT_TEMPLATE.format(document_text=document_text, question_text=question_text)
+
+
+def fill_answer(ai_question, answer_text, topic_text, start_time, served_from_cache=False,
+                prompt_tokens=None, completion_tokens=None):
+    if served_from_cache:
+        prompt_tokens = completion_tokens = 0
+    ai_question.answer = answer_text
+    ai_question.topic = topic_text
+    ai_question.prompt_tokens = prompt_tokens
+    ai_question.completion_tokens = completion_tokens
+    ai_question.tokens_used = (
+        (prompt_tokens or 0) + (completion_tokens or 0)
+        if prompt_tokens is not None or completion_tokens is not None else None
+    )
+    ai_question.served_from_cache = served_from_cache
+    ai_question.response_time_ms = int((time.time() - start_time) * 1000)
+    ai_question.status = "answered"
+    ai_question.answered_at = timezone.now()
+    return ai_question
+
+
+def save_answer(ai_question, answer_text, topic_text, start_time, served_from_cache=False,
+                prompt_tokens=None, completion_tokens=None):
+    """
+    Save the answer on the AIQuestion (new answers are put in the answer
+    cache by whoever generated them, before releasing the in_flight lease)
+    """
+    fill_answer(
+        ai_question, answer_text, topic_text, start_time, served_from_cache,
+        prompt_tokens, completion_tokens,
+    )
+    ai_question.save()
+    return ai_question
+
+
+def answer_from_cache(ai_question, start_time):
+    """
+    Same question on the same document text: answer without the LLM
+    """
+    cached = get_cached_answer(ai_question.document, ai_question.question)
+    if not cached:
+        return False
+    ai_question.ai_model = cached["ai_model"]
+    save_answer(ai_question, cached["answer"], cached["topic"], start_time, served_from_cache=True)
+    return True
+
+
+def answer_question(ai_question):
+    """
+    Run the full ask pipeline for an AIQuestion and save the result on it
+    """
+    start_time = time.time()
+    document = ai_question.document
+
+    ensure_document_text(document)
+    if answer_from_cache(ai_question, start_time):
+        return ai_question
+
+    def generate():
+        prompt = build_prompt(document, ai_question.question, ai_question.group.organization)
+        response = get_provider().generate(prompt)
+        answer_text, topic_text = parse_answer(response.text)
+        store_answer(document, ai_question.question, answer_text, topic_text, response.model)
+        return response, answer_text, topic_text
+
+    # Concurrent askers of the same question share one generation
+    result, shared = in_flight.do(
+        make_key(document, ai_question.question),
+        generate,
+        lambda: get_cached_answer(document, ai_question.question),
+    )
+    if shared:
+        ai_question.ai_model = result["ai_model"]
+        return save_answer(ai_question, result["answer"], result["topic"], start_time, served_from_cache=True)
+
+    response, answer_text, topic_text = result
+    ai_question.ai_model = response.model
+    return save_answer(
+        ai_question, answer_text, topic_text, start_time,
+        prompt_tokens=response.prompt_tokens, completion_tokens=response.completion_tokens,
+    )
+
+
+# ---------------------------
+# Batch (many questions, one LLM call)
+# ---------------------------
+BATCH_PROMPT_TEMPLATE = """
+You are an AI assistant.
+
+Use the document excerpts below to answer each numbered question.
+
+Rules:
+- Answer every question, in order
+- Answer clearly
+- Give a SHORT topic (1–3 words) for each question
+- No markdown
+- No bullets
+- Plain text only
+
+Return STRICTLY in this format, one block per question:
+
+QUESTION 1:
+ANSWER:
+<answer here>
+TOPIC:
+<topic here>
+
+QUESTION 2:
+ANSWER:
+<answer here>
+TOPIC:
+<topic here>
+
+Document excerpts:
+{document_text}
+
+Questions:
+{questions_text}
+"""
+
+QUESTION_BLOCK_RE = re.compile(r"^\s*QUESTION\s+(\d+)\s*:", re.MULTILINE)
+
+
+def parse_batch_answers(raw_text, count):
+    """
+    {question number: (answer, topic)} for every QUESTION n: block in the reply
+    """
+    parts = QUESTION_BLOCK_RE.split(raw_text)
+    answers = {}
+    for number, block in zip(parts[1::2], parts[2::2]):
+        number = int(number)
+        if 1 <= number <= count and number not in answers:
+            answers[number] = parse_answer(block)
+    return answers
+
+
+def _split_tokens(total, count):
+    if total is None:
+        return [None] * count
+    share, extra = divmod(total, count)
+    return [share + (1 if i < extra else 0) for i in range(count)]
+
+
+def _fill_from_cache(row, document, start_time):
+    cached = get_cached_answer(document, row.question)
+    if not cached:
+        return False
+    row.ai_model = cached["ai_model"]
+    fill_answer(row, cached["answer"], cached["topic"], start_time, served_from_cache=True)
+    return True
+
+
+def answer_questions_batch(user, document, group, questions):
+    """
+    Answer many questions about one document with a single LLM call and
+    bulk-create their AIQuestion rows. Cached questions skip the call, and
+    questions being answered elsewhere right now wait for that answer.
+    """
+    start_time = time.time()
+    ensure_document_text(document)
+
+    rows = [AIQuestion(user=user, document=document, group=group, question=q) for q in questions]
+    pending = [row for row in rows if not _fill_from_cache(row, document, start_time)]
+
+    leases = {}
+    following = []
+    for row in pending:
+        key = make_key(document, row.question)
+        token = None if key in leases else in_flight.try_lead(key)
+        if token:
+            leases[key] = (token, row)
+        else:
+            following.append((key, row))
+
+    try:
+        _generate_batch([row for _, row in leases.values()], document, group, start_time)
+    finally:
+        for key, (token, _) in leases.items():
+            in_flight.release(key, token)
+
+    missed = []
+    for key, row in following:
+        in_flight.wait(key, lambda: get_cached_answer(document, row.question))
+        if not _fill_from_cache(row, document, start_time):
+            missed.append(row)
+    _generate_batch(missed, document, group, start_time)
+
+    created = AIQuestion.objects.bulk_create(rows)
+    # bulk_create skips post_save, so the stats counters are bumped here
+    bump_group_stats(group.id, questions_count=len(created))
+    bump_document_stats(document.id, questions_count=len(created))
+    return created
+
+
+def _generate_batch(pending, document, group, start_time):
+    """
+    Answer the rows with one LLM call, storing each answer in the cache
+    """
+    if not pending:
+        return
+
+    questions_text = "\n".join(f"{i}. {row.question}" for i, row in enumerate(pending, 1))
+    token_budget = context_token_budget(
+        group.organization,
+        BATCH_PROMPT_TEMPLATE.format(document_text="", questions_text=questions_text),
+    )
+    document_text = select_context_for_questions(
+        document, [row.question for row in pending], token_budget=token_budget
+    )
+    response = get_provider().generate(
+        BATCH_PROMPT_TEMPLATE.format(document_text=document_text, questions_text=questions_text)
+    )
+    answers = parse_batch_answers(response.text, len(pending))
+
+    prompt_shares = _split_tokens(response.prompt_tokens, len(pending))
+    completion_shares = _split_tokens(response.completion_tokens, len(pending))
+    for number, row in enumerate(pending, 1):
+        row.ai_model = response.model
+        if number not in answers:
+            row.status = "failed"
+            continue
+        answer_text, topic_text = answers[number]
+        fill_answer(
+            row, answer_text, topic_text, start_time,
+            prompt_tokens=prompt_shares[number - 1],
+            completion_tokens=completion_shares[number - 1],
+        )
+        store_answer(document, row.question, answer_text, topic_text, row.ai_model)
+
+
+# ---------------------------
+# Streaming
+# ---------------------------
+class AnswerStreamFilter:
+    """
+    Turns the raw "ANSWER: ... TOPIC: ..." stream into deltas of the answer
+    text only, holding back just enough characters to never leak a
+    partial "TOPIC:" marker
+    """
+    ANSWER_MARK = "ANSWER:"
+    TOPIC_MARK = "TOPIC:"
+
+    def __init__(self):
+        self.raw = ""
+        self.sent = 0
+
+    def feed(self, text):
+        self.raw += text
+        body = self.raw.lstrip()
+        if len(body) < len(self.ANSWER_MARK) and self.ANSWER_MARK.startswith(body):
+            return ""  # "ANSWER:" is still arriving
+        if body.startswith(self.ANSWER_MARK):
+            body = body[len(self.ANSWER_MARK):].lstrip()
+
+        if self.TOPIC_MARK in body:
+            answer = body.split(self.TOPIC_MARK)[0]
+        else:
+            answer = body[:max(0, len(body) - len(self.TOPIC_MARK) + 1)]
+
+        delta = answer[self.sent:]
+        self.sent += len(delta)
+        return delta
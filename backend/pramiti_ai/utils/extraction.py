@@ -0,0 +1,204 @@
+# pramiti_ai/utils/extraction.py
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from groups.models import Document, DocumentBlob
+from groups.utils.background import run_in_pool, submit_to
+from pramiti_ai.models import DocumentPage
+from pramiti_ai.utils.pdf import PDF_ERRORS, extract_pages
+from pramiti_ai.utils.previews import ensure_previews
+from pramiti_ai.utils.retrieval import build_chunk_index
+from pramiti_ai.utils.answer_cache import invalidate_document
+
+
+class ExtractionPendingError(Exception):
+    pass
+
+
+class ExtractionFailedError(ExtractionPendingError):
+    """
+    The extraction was retried for this ask and failed again
+    """
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool():
+    """
+    Process pool for PDF parsing (CPU bound, keeps the GIL free for requests)
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=settings.PDF_EXTRACTION_PROCESSES)
+            _pool_pid = os.getpid()
+    return _pool
+
+
+def schedule_extraction(document):
+    """
+    Extract a newly uploaded document in the background. A file that was
+    already extracted (same content hash) is linked right away instead.
+    """
+    if document.blob_id and document.blob.extracted_at:
+        extract_document(document.id)
+        document.refresh_from_db(fields=[
+            "page_count", "text_length", "content_hash", "extraction_status", "extraction_ms",
+        ])
+    else:
+        run_in_pool("extraction", extract_document, document.id)
+
+
+def _stale_before():
+    """
+    Extractions started before this are taken to have died with their worker
+    """
+    return timezone.now() - timedelta(seconds=settings.PDF_EXTRACTION_TIMEOUT_SECONDS)
+
+
+def _claim(document_id):
+    """
+    Mark the document as being extracted; False if someone else already is
+    """
+    return Document.objects.filter(
+        Q(extraction_status__in=["pending", "failed"])
+        | Q(extraction_status="processing", extraction_started_at__lt=_stale_before()),
+        id=document_id,
+    ).update(extraction_status="processing", extraction_started_at=timezone.now()) == 1
+
+
+def save_pages(blob, page_texts):
+    """
+    Store the blob's DocumentPage rows and chunk index. Offsets index into
+    the pages' text joined with "\n" (empty pages are kept, with an empty
+    span). Skipped if another extraction of the same file finished first.
+    """
+    hasher = hashlib.sha256()
+    pages = []
+    offset = 0
+    for number, text in enumerate(page_texts, 1):
+        text = (text or "").strip()
+        if text:
+            if offset:
+                offset += 1  # the "\n" joining it to the previous page
+                hasher.update(b"\n")
+            hasher.update(text.encode("utf-8"))
+        pages.append(DocumentPage(
+            blob=blob,
+            page_number=number,
+            text=text,
+            start_offset=offset,
+            end_offset=offset + len(text),
+        ))
+        offset += len(text)
+
+    with transaction.atomic():
+        blob = DocumentBlob.objects.select_for_update().get(id=blob.id)
+        if blob.extracted_at:
+            return blob
+
+        DocumentPage.objects.filter(blob=blob).delete()
+        DocumentPage.objects.bulk_create(pages, batch_size=500)
+        build_chunk_index(blob)
+
+        blob.page_count = len(pages)
+        blob.text_length = offset
+        blob.text_hash = hasher.hexdigest() if offset else ""
+        blob.extracted_at = timezone.now()
+        blob.save(update_fields=["page_count", "text_length", "text_hash", "extracted_at"])
+    return blob
+
+
+def extract_blob(blob):
+    """
+    Parse the blob's PDF in the process pool and store the result. Only
+    an unreadable PDF is stored as empty; other errors leave the blob
+    unextracted, to be retried.
+    """
+    try:
+        page_texts = extract_pages(blob.file.path, executor=_process_pool())
+    except PDF_ERRORS:
+        page_texts = []
+    return save_pages(blob, page_texts)
+
+
+def extract_document(document_id):
+    """
+    Make the document's text available: reuse its blob's extraction or
+    run it. Returns False if the document was already claimed by another
+    extraction.
+    """
+    if not _claim(document_id):
+        return False
+
+    document = Document.objects.select_related("blob").get(id=document_id)
+    start_time = time.time()
+    blob = document.blob
+    try:
+        if blob is not None and blob.extracted_at is None:
+            blob = extract_blob(blob)
+    except Exception:
+        Document.objects.filter(id=document_id).update(extraction_status="failed")
+        raise
+
+    if blob is not None:
+        ensure_previews(blob, executor=_process_pool())
+
+    # No text (or no stored file) means a scanned / unreadable PDF: done, nothing to index
+    document.page_count = blob.page_count if blob else 0
+    document.text_length = blob.text_length if blob else 0
+    document.content_hash = blob.text_hash if blob else ""
+    document.extraction_status = "done"
+    document.extraction_ms = int((time.time() - start_time) * 1000)
+    document.save(update_fields=[
+        "page_count", "text_length", "content_hash", "extraction_status", "extraction_ms",
+    ])
+    invalidate_document(document.id)
+    return True
+
+
+def wait_for_extraction(document, timeout=None):
+    """
+    Make sure the document's text is available to the ask path: reuse a
+    finished extraction or wait for the background one. Documents that
+    aren't being extracted (lost on a restart, failed, or claimed by a
+    worker that died) are queued again; the request itself never parses
+    the PDF.
+    """
+    timeout = settings.PDF_EXTRACTION_WAIT_SECONDS if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    queued = False
+
+    while document.extraction_status != "done":
+        stale = (
+            document.extraction_status == "processing"
+            and document.extraction_started_at is not None
+            and document.extraction_started_at < _stale_before()
+        )
+        if not queued and (document.extraction_status in ("pending", "failed") or stale):
+            # back to pending, so a "failed" seen from now on is the retry's
+            Document.objects.filter(id=document.id, extraction_status="failed").update(extraction_status="pending")
+            # a second extraction of the same document loses the claim and does nothing
+            submit_to("extraction", extract_document, document.id)
+            queued = True
+        elif queued and document.extraction_status == "failed":
+            raise ExtractionFailedError("This document could not be processed. Please try again later.")
+        if time.monotonic() >= deadline:
+            raise ExtractionPendingError("This document is still being processed. Please try again shortly.")
+        time.sleep(0.5)
+        document.refresh_from_db(fields=[
+            "page_count", "text_length", "content_hash", "extraction_status", "extraction_ms",
+            "extraction_started_at",
+        ])
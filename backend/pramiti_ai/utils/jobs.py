@@ -0,0 +1,84 @@
+# pramiti_ai/utils/jobs.py
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from pramiti_ai.models import AIQuestion
+from pramiti_ai.utils.ask import answer_question, UnreadableDocumentError
+from pramiti_ai.utils.tokens import PromptTooLargeError
+from pramiti_ai.utils.extraction import ExtractionFailedError, ExtractionPendingError
+
+logger = logging.getLogger(__name__)
+
+
+def claim_next_question():
+    """
+    Claim the oldest pending AIQuestion that is due (or one whose worker
+    died) with SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers
+    never collide
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.AI_JOB_TIMEOUT_SECONDS)
+    with transaction.atomic():
+        ai_question = (
+            AIQuestion.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status="pending", not_before__isnull=True)
+                | Q(status="pending", not_before__lte=now)
+                | Q(status="processing", claimed_at__lt=stale_before)
+            )
+            .order_by("asked_at")
+            .first()
+        )
+        if ai_question is None:
+            return None
+        ai_question.status = "processing"
+        ai_question.claimed_at = timezone.now()
+        ai_question.save(update_fields=["status", "claimed_at"])
+    return ai_question
+
+
+def process_question(ai_question):
+    try:
+        answer_question(ai_question)
+    except ExtractionPendingError as e:
+        if isinstance(e, ExtractionFailedError) or ai_question.retry_count >= settings.AI_JOB_MAX_RETRIES:
+            logger.warning("AI question %s failed: %s", ai_question.id, e)
+            ai_question.status = "failed"
+            ai_question.save(update_fields=["status"])
+            return
+        # Document text not ready yet: back in the queue, behind the questions that can be answered now
+        delay = settings.AI_JOB_RETRY_SECONDS * 2 ** ai_question.retry_count
+        ai_question.status = "pending"
+        ai_question.retry_count += 1
+        ai_question.not_before = timezone.now() + timedelta(seconds=delay)
+        ai_question.save(update_fields=["status", "retry_count", "not_before"])
+    except (UnreadableDocumentError, PromptTooLargeError) as e:
+        logger.warning("AI question %s failed: %s", ai_question.id, e)
+        ai_question.status = "failed"
+        ai_question.save(update_fields=["status"])
+    except Exception:
+        logger.exception("AI question %s failed", ai_question.id)
+        ai_question.status = "failed"
+        ai_question.save(update_fields=["status"])
+
+
+def run_worker(poll_interval=1.0, burst=False, should_stop=lambda: False):
+    """
+    Process queued questions until stopped (or until the queue is empty in burst mode)
+    """
+    while not should_stop():
+        close_old_connections()
+        ai_question = claim_next_question()
+        if ai_question is None:
+            if burst:
+                return
+            time.sleep(poll_interval)
+            continue
+        process_question(ai_question)
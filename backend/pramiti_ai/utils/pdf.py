@@ -1,19 +1,140 @@
+import io
+import threading
+
 import pdfplumber
+import pypdfium2 as pdfium
+from pdfminer.pdfparser import PDFSyntaxError
+from pdfplumber.utils.exceptions import PdfminerException
+
+# Pages handed to one worker process at a time
+PAGES_PER_TASK = 32
+PREVIEW_QUALITY = 70
+
+# What the parsers raise for a file that isn't a readable PDF (other
+# errors, e.g. I/O or a broken pool, are worth retrying)
+PDF_ERRORS = (pdfium.PdfiumError, PDFSyntaxError, PdfminerException)
+
+# PDFium isn't thread safe: calls made in this process are serialized
+_pdfium_lock = threading.Lock()
 
-def extract_text_from_pdf(pdf_path):
-    text = ""
 
+def run_pdf_task(executor, fn, *args):
+    """
+    fn(*args) in a worker of the executor (a process pool), or in this
+    thread holding _pdfium_lock when there is none
+    """
+    if executor is not None:
+        return executor.submit(fn, *args).result()
+    with _pdfium_lock:
+        return fn(*args)
+
+
+def _pdfplumber_page(plumber_pdf, index):
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
+        return plumber_pdf.pages[index].extract_text() or ""
+    except Exception:
+        # skip broken pages
+        return ""
+
+
+def extract_page_range(pdf_path, start, stop, engine="auto"):
+    """
+    Text of pages [start, stop). The "auto" engine uses pypdfium2 and only
+    falls back to pdfplumber for pages pypdfium2 fails on.
+    """
+    texts = []
+    pdf = None
+    plumber_pdf = None
+    try:
+        if engine != "pdfplumber":
+            try:
+                pdf = pdfium.PdfDocument(pdf_path)
+            except Exception:
+                pdf = None
+
+        for index in range(start, stop):
+            text = None
+            if pdf is not None:
                 try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
+                    page = pdf[index]
+                    textpage = page.get_textpage()
+                    text = textpage.get_text_range().replace("\r\n", "\n")
+                    textpage.close()
+                    page.close()
                 except Exception:
-                    # skip broken pages
-                    continue
+                    text = None
+
+            if text is None and engine != "pdfium":
+                if plumber_pdf is None:
+                    plumber_pdf = pdfplumber.open(pdf_path)
+                text = _pdfplumber_page(plumber_pdf, index)
+
+            texts.append(text or "")
+    finally:
+        if pdf is not None:
+            pdf.close()
+        if plumber_pdf is not None:
+            plumber_pdf.close()
+    return texts
+
+
+def page_count(pdf_path):
+    try:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
     except Exception:
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+
+
+def extract_pages(pdf_path, executor=None, engine="auto"):
+    """
+    Text of every page, in order. With an executor (a process pool) all
+    parsing runs in its workers, the pages split into ranges extracted in
+    parallel.
+    """
+    count = run_pdf_task(executor, page_count, pdf_path)
+    if executor is None:
+        return run_pdf_task(None, extract_page_range, pdf_path, 0, count, engine)
+
+    futures = [
+        executor.submit(extract_page_range, pdf_path, start, min(start + PAGES_PER_TASK, count), engine)
+        for start in range(0, count, PAGES_PER_TASK)
+    ]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def extract_text_from_pdf(pdf_path, executor=None, engine="auto"):
+    try:
+        pages = extract_pages(pdf_path, executor, engine)
+    except PDF_ERRORS:
         return ""
 
-    return text.strip()
+    return "\n".join(text.strip() for text in pages if text.strip())
+
+
+def render_page_images(pdf_path, indexes, width, quality=PREVIEW_QUALITY):
+    """
+    WebP images (bytes) of the given pages, scaled to `width` pixels wide
+    """
+    images = []
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        for index in indexes:
+            page = pdf[index]
+            try:
+                image = page.render(scale=width / page.get_width()).to_pil()
+                buffer = io.BytesIO()
+                image.convert("RGB").save(buffer, "WEBP", quality=quality)
+                images.append(buffer.getvalue())
+            finally:
+                page.close()
+    finally:
+        pdf.close()
+    return images
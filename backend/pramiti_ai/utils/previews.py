@@ -0,0 +1,71 @@
+# pramiti_ai/utils/previews.py
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from groups.models import DocumentBlob
+from pramiti_ai.utils.pdf import page_count, render_page_images, run_pdf_task
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_NAME = "thumbnail"
+
+
+def page_preview_name(page_number):
+    return f"page-{page_number}"
+
+
+def preview_path(sha256, name):
+    """
+    Storage path of a rendered image; named by the file's content hash so
+    it never changes once written
+    """
+    return f"document_previews/{sha256[:2]}/{sha256}/{name}.webp"
+
+
+def render_previews(blob, executor=None):
+    """
+    Render the first-page thumbnail and low-resolution previews of the
+    first DOCUMENT_PREVIEW_PAGES pages. Returns the number of page previews.
+    """
+    path = blob.file.path
+    count = min(run_pdf_task(executor, page_count, path), settings.DOCUMENT_PREVIEW_PAGES)
+    if count == 0:
+        return 0
+
+    jobs = [
+        (render_page_images, path, [0], settings.DOCUMENT_THUMBNAIL_WIDTH),
+        (render_page_images, path, range(count), settings.DOCUMENT_PREVIEW_WIDTH),
+    ]
+    if executor is None:
+        thumbnail, pages = [run_pdf_task(None, fn, *args) for fn, *args in jobs]
+    else:
+        futures = [executor.submit(fn, *args) for fn, *args in jobs]
+        thumbnail, pages = [future.result() for future in futures]
+
+    images = [(THUMBNAIL_NAME, thumbnail[0])]
+    images += [(page_preview_name(number), data) for number, data in enumerate(pages, 1)]
+    for name, data in images:
+        name = preview_path(blob.sha256, name)
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+
+    blob.preview_count = count
+    DocumentBlob.objects.filter(id=blob.id).update(preview_count=count)
+    return count
+
+
+def ensure_previews(blob, executor=None):
+    """
+    Render previews if the blob has none yet; failures only get logged
+    """
+    if blob.preview_count or not blob.file:
+        # blobs migrated without their file only have text
+        return blob.preview_count
+    try:
+        return render_previews(blob, executor)
+    except Exception:
+        logger.exception("Rendering previews for blob %s failed", blob.id)
+        return 0
@@ -0,0 +1,186 @@
+import math
+import re
+import threading
+from collections import Counter
+from itertools import zip_longest
+
+from cachetools import LRUCache
+from django.conf import settings
+from django.db import transaction
+
+from pramiti_ai.models import DocumentChunk, DocumentPage
+from pramiti_ai.utils.tokens import estimate_tokens
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it
+its me my no not of on or our so that the their them then there these they
+this to was we what when where which who why will with you your
+""".split())
+
+# BM25 tuning
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def split_into_chunks(text, size=None, overlap=None):
+    """
+    Split text into overlapping windows of words
+    """
+    size = size or settings.AI_CHUNK_SIZE_WORDS
+    overlap = min(overlap if overlap is not None else settings.AI_CHUNK_OVERLAP_WORDS, size - 1)
+
+    words = text.split()
+    chunks = []
+    step = size - overlap
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + size]))
+        if start + size >= len(words):
+            break
+    return chunks
+
+
+# ---------------------------
+# Building the index
+# ---------------------------
+def document_text(blob):
+    """
+    The extracted text of a document blob, rebuilt from its stored pages
+    """
+    texts = DocumentPage.objects.filter(blob=blob).order_by("page_number").values_list("text", flat=True)
+    return "\n".join(text for text in texts if text)
+
+
+def build_chunk_index(blob):
+    """
+    (Re)build the chunk rows for a document blob from its extracted text
+    """
+    chunks = [
+        DocumentChunk(
+            blob=blob,
+            index=i,
+            text=chunk,
+            token_count=estimate_tokens(chunk),
+            term_freqs=dict(Counter(tokenize(chunk))),
+        )
+        for i, chunk in enumerate(split_into_chunks(document_text(blob)))
+    ]
+    with transaction.atomic():
+        DocumentChunk.objects.filter(blob=blob).delete()
+        DocumentChunk.objects.bulk_create(chunks, batch_size=500)
+
+    _index_cache.pop(blob.id, None)
+    return len(chunks)
+
+
+class ChunkIndex:
+    """
+    In-memory BM25 inverted index over one document's chunks
+    """
+
+    def __init__(self, rows):
+        self.chunks = []     # (index, text, token_count)
+        self.postings = {}   # term -> [(position, tf), ...]
+        self.lengths = []
+
+        for pos, (index, text, token_count, term_freqs) in enumerate(rows):
+            self.chunks.append((index, text, token_count))
+            self.lengths.append(sum(term_freqs.values()))
+            for term, tf in term_freqs.items():
+                self.postings.setdefault(term, []).append((pos, tf))
+
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+
+    def search(self, query):
+        n = len(self.chunks)
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for pos, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[pos] / (self.avg_length or 1))
+                scores[pos] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores.most_common()
+
+
+# blob_id -> (first chunk id, ChunkIndex); documents with the same file share it
+_index_cache = LRUCache(maxsize=128)
+_index_lock = threading.Lock()
+
+
+def get_chunk_index(document):
+    if document.blob_id is None:
+        return None
+
+    chunk_ids = DocumentChunk.objects.filter(blob_id=document.blob_id).order_by("index").values_list("id", flat=True)
+    first_id = chunk_ids.first()
+    if first_id is None:
+        if not document.text_length:
+            return None
+        build_chunk_index(document.blob)
+        first_id = chunk_ids.first()
+
+    with _index_lock:
+        cached = _index_cache.get(document.blob_id)
+    if cached and cached[0] == first_id:
+        return cached[1]
+
+    rows = DocumentChunk.objects.filter(blob_id=document.blob_id).order_by("index").values_list(
+        "index", "text", "token_count", "term_freqs"
+    )
+    index = ChunkIndex(list(rows))
+    with _index_lock:
+        _index_cache[document.blob_id] = (first_id, index)
+    return index
+
+
+# ---------------------------
+# Querying
+# ---------------------------
+def select_context(document, question, token_budget=None, top_k=None):
+    """
+    Return the most relevant chunks of a document for a question,
+    packed into the token budget and kept in document order
+    """
+    return select_context_for_questions(document, [question], token_budget, top_k)
+
+
+def select_context_for_questions(document, questions, token_budget=None, top_k=None):
+    """
+    Same as select_context for several questions at once: each question's
+    ranking is taken in turn so every question gets its best chunks in
+    """
+    token_budget = token_budget or settings.AI_CONTEXT_TOKEN_BUDGET
+    top_k = top_k or settings.AI_RETRIEVAL_TOP_K * len(questions)
+
+    index = get_chunk_index(document)
+    if index is None:
+        return ""
+
+    rankings = [[pos for pos, _ in index.search(q or "")] for q in questions]
+    ranked = list(dict.fromkeys(
+        pos for tier in zip_longest(*rankings) for pos in tier if pos is not None
+    ))
+    if not ranked:
+        # Nothing matched: fall back to the start of the document
+        ranked = list(range(len(index.chunks)))
+
+    selected = []
+    used = 0
+    for pos in ranked:
+        if len(selected) >= top_k:
+            break
+        token_count = index.chunks[pos][2]
+        if used + token_count > token_budget:
+            continue
+        selected.append(pos)
+        used += token_count
+
+    return "\n\n".join(index.chunks[pos][1] for pos in sorted(selected))
@@ -0,0 +1,94 @@
+# pramiti_ai/utils/singleflight.py
+import asyncio
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls across threads and processes through a
+    shared cache: the caller that adds the lease key runs the function,
+    everyone else polls `lookup` until the leader's result is stored.
+    The leader must store its result (where `lookup` finds it) before
+    releasing the lease.
+    """
+
+    def __init__(self, cache_alias):
+        self.cache_alias = cache_alias
+
+    def _cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def _lease_key(key):
+        return f"lease:{key}"
+
+    def try_lead(self, key):
+        """
+        Take the lease for key; False if another caller holds it. Returns
+        a token to pass to release() otherwise.
+        """
+        token = uuid.uuid4().hex
+        if self._cache().add(self._lease_key(key), token, timeout=settings.AI_SINGLEFLIGHT_LEASE_SECONDS):
+            return token
+        return False
+
+    def release(self, key, token):
+        lease = self._lease_key(key)
+        # an expired lease may have been taken over; leave that one alone
+        if self._cache().get(lease) == token:
+            self._cache().delete(lease)
+
+    def _poll(self, key, lookup, deadline):
+        """
+        (done, result): done once the result is there, the leader gave up
+        (lease released without a result) or the wait timed out
+        """
+        result = lookup()
+        if result is not None:
+            return True, result
+        if self._cache().get(self._lease_key(key)) is None or time.monotonic() >= deadline:
+            return True, None
+        return False, None
+
+    def wait(self, key, lookup):
+        """
+        The leader's result, or None if it failed or took longer than the lease
+        """
+        deadline = time.monotonic() + settings.AI_SINGLEFLIGHT_LEASE_SECONDS
+        while True:
+            done, result = self._poll(key, lookup, deadline)
+            if done:
+                return result
+            time.sleep(settings.AI_SINGLEFLIGHT_POLL_SECONDS)
+
+    async def wait_async(self, key, lookup):
+        from asgiref.sync import sync_to_async
+
+        deadline = time.monotonic() + settings.AI_SINGLEFLIGHT_LEASE_SECONDS
+        while True:
+            done, result = await sync_to_async(self._poll)(key, lookup, deadline)
+            if done:
+                return result
+            await asyncio.sleep(settings.AI_SINGLEFLIGHT_POLL_SECONDS)
+
+    def do(self, key, fn, lookup):
+        """
+        Returns (result, shared): shared is True (and result is what
+        `lookup` returned) for callers that waited on another caller
+        """
+        token = self.try_lead(key)
+        if not token:
+            result = self.wait(key, lookup)
+            if result is not None:
+                return result, True
+            # the leader failed or is stuck: run it here
+            token = self.try_lead(key)
+        try:
+            return fn(), False
+        finally:
+            if token:
+                self.release(key, token)
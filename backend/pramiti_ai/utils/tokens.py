@@ -0,0 +1,37 @@
+# pramiti_ai/utils/tokens.py
+from django.conf import settings
+
+
+class PromptTooLargeError(Exception):
+    pass
+
+
+def estimate_tokens(text):
+    """
+    Cheap local estimate of LLM tokens (~4 characters per token)
+    """
+    return (len(text or "") + 3) // 4
+
+
+def get_prompt_token_budget(organization):
+    """
+    Max prompt tokens for one request: the organization's own budget if set,
+    else AI_ORG_PROMPT_TOKEN_BUDGET
+    """
+    if organization is not None and organization.ai_prompt_token_budget:
+        return organization.ai_prompt_token_budget
+    return settings.AI_ORG_PROMPT_TOKEN_BUDGET
+
+
+def context_token_budget(organization, fixed_text):
+    """
+    Tokens left for document excerpts once the fixed part of the prompt
+    (instructions + questions) is counted. Rejects prompts that can't fit.
+    """
+    budget = get_prompt_token_budget(organization)
+    remaining = budget - estimate_tokens(fixed_text)
+    if remaining <= 0:
+        raise PromptTooLargeError(
+            f"Question is too long: the prompt would exceed the {budget} token budget."
+        )
+    return min(remaining, settings.AI_CONTEXT_TOKEN_BUDGET)
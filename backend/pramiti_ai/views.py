@@ -1,31 +1,33 @@
 # pramiti_ai/views.py
-import os
+import json
 import time
-from dotenv import load_dotenv
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
-from django.db.models import Count
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.db.models import Count, Sum, Avg, Q, F
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.permissions import IsAuthenticated
-
-import google.generativeai as genai
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
 
 from .models import AIQuestion, DocumentNote
 from .serializers import AIQuestionSerializer, DocumentNoteSerializer, ActivityLogSerializer
 from accounts.authentication import UserOrgJWTAuthentication
+from accounts.permissions import IsOrganization
 from groups.models import Document, Group
-from pramiti_ai.utils.pdf import extract_text_from_pdf
-
-# Load .env
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("❌ GEMINI_API_KEY not found in .env file")
-
-# Configure Gemini AI
-genai.configure(api_key=GEMINI_API_KEY)
+from pramiti_ai.utils.ask import (
+    answer_question, UnreadableDocumentError, ensure_document_text, answer_from_cache,
+    build_prompt, parse_answer, save_answer, AnswerStreamFilter, answer_questions_batch, in_flight,
+)
+from pramiti_ai.utils.answer_cache import get_cached_answer, make_key, store_answer
+from pramiti_ai.utils.ai_service import get_provider
+from pramiti_ai.utils.tokens import PromptTooLargeError, get_prompt_token_budget
+from pramiti_ai.utils.extraction import ExtractionPendingError
 
 
 # ---------------------------
@@ -43,84 +45,197 @@ class AskAIQuestionAPIView(APIView):
         document = get_object_or_404(Document, id=document_id)
         group = get_object_or_404(Group, id=group_id)
 
+        run_async = str(request.data.get("async", settings.AI_ASK_ASYNC)).lower() in ("1", "true")
+
         ai_question = AIQuestion.objects.create(
             user=request.user,
             document=document,
             group=group,
             question=question_text,
-            status="answered"  # temporary
+            status="pending" if run_async else "processing"
         )
 
-        start_time = time.time()
+        # Async mode: a run_ai_workers process answers it, the client polls
+        if run_async:
+            serializer = AIQuestionSerializer(ai_question)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
         try:
-            # Extract document text once
-            if not document.content:
-                document.content = extract_text_from_pdf(document.file.path)
-                document.save()
-
-            document_text = document.content
-            if not document_text:
-                return Response(
-                    {"error": "This document is scanned or unreadable. AI cannot process it."},
-                    status=400
-                )
+            answer_question(ai_question)
+            serializer = AIQuestionSerializer(ai_question)
+            return Response(serializer.data)
 
-            # Gemini AI model
-            model = genai.GenerativeModel("gemini-2.5-flash")
-            prompt = f"""
-You are an AI assistant.
+        except (UnreadableDocumentError, PromptTooLargeError) as e:
+            ai_question.status = "failed"
+            ai_question.save()
+            return Response({"error": str(e)}, status=400)
 
-Use the document below to answer the question.
+        except ExtractionPendingError as e:
+            ai_question.status = "failed"
+            ai_question.save()
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-Rules:
-- Answer clearly
-- Give a SHORT topic (1–3 words)
-- No markdown
-- No bullets
-- Plain text only
+        except Exception as e:
+            ai_question.status = "failed"
+            ai_question.save()
+            return Response({"error": str(e)}, status=500)
 
-Return STRICTLY in this format:
 
-ANSWER:
-<answer here>
+# ---------------------------
+# Ask AI Questions in batch (one LLM call)
+# ---------------------------
+class AskAIQuestionBatchAPIView(APIView):
+    permission_classes = [IsAuthenticated]
 
-TOPIC:
-<topic here>
+    def post(self, request, document_id):
+        questions = request.data.get("questions")
+        group_id = request.data.get("group_id")
+        if not group_id:
+            return Response({"error": "group_id is required"}, status=400)
+        if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+            return Response({"error": "questions must be a non-empty list of strings"}, status=400)
+        if len(questions) > settings.AI_BATCH_MAX_QUESTIONS:
+            return Response({"error": f"At most {settings.AI_BATCH_MAX_QUESTIONS} questions per batch"}, status=400)
 
-Document:
-{document_text}
+        document = get_object_or_404(Document, id=document_id)
+        group = get_object_or_404(Group.objects.select_related("organization"), id=group_id)
 
-Question:
-{question_text}
-"""
-            response = model.generate_content(prompt)
-            raw_text = response.text.strip()
+        try:
+            ai_questions = answer_questions_batch(request.user, document, group, questions)
+        except (UnreadableDocumentError, PromptTooLargeError) as e:
+            return Response({"error": str(e)}, status=400)
+        except ExtractionPendingError as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response({"error": str(e)}, status=500)
 
-            if "TOPIC:" in raw_text:
-                answer_text = raw_text.split("TOPIC:")[0].replace("ANSWER:", "").strip()
-                topic_text = raw_text.split("TOPIC:")[1].strip()
+        serializer = AIQuestionSerializer(ai_questions, many=True)
+        return Response({"questions": serializer.data})
+
+
+# ---------------------------
+# Ask AI Question (streamed over Server-Sent Events)
+# ---------------------------
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _prepare_streamed_question(request, document_id):
+    """
+    Synchronous part of the streaming endpoint: auth, lookups, extraction and cache
+    """
+    try:
+        auth = UserOrgJWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        auth = None
+    if auth is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401), None
+
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400), None
+    group_id = data.get("group_id")
+    if not group_id:
+        return JsonResponse({"error": "group_id is required"}, status=400), None
+
+    document = get_object_or_404(Document, id=document_id)
+    group = get_object_or_404(Group.objects.select_related("organization"), id=group_id)
+
+    ai_question = AIQuestion.objects.create(
+        user=auth[0],
+        document=document,
+        group=group,
+        question=data.get("question"),
+        status="processing"
+    )
+    try:
+        ensure_document_text(document)
+    except UnreadableDocumentError as e:
+        ai_question.status = "failed"
+        ai_question.save()
+        return JsonResponse({"error": str(e)}, status=400), None
+    except ExtractionPendingError as e:
+        ai_question.status = "failed"
+        ai_question.save()
+        return JsonResponse({"error": str(e)}, status=503), None
+    return None, ai_question
+
+
+@csrf_exempt
+@require_POST
+async def ask_ai_stream(request, document_id):
+    start_time = time.time()
+    error_response, ai_question = await sync_to_async(_prepare_streamed_question)(request, document_id)
+    if error_response is not None:
+        return error_response
+
+    document, question = ai_question.document, ai_question.question
+
+    async def events():
+        key = lease = None
+        try:
+            served = await sync_to_async(answer_from_cache)(ai_question, start_time)
+            if not served:
+                key = await sync_to_async(make_key)(document, question)
+                lease = await sync_to_async(in_flight.try_lead)(key)
+                if not lease:
+                    # Being answered by another request right now: wait for its answer
+                    await in_flight.wait_async(key, lambda: get_cached_answer(document, question))
+                    served = await sync_to_async(answer_from_cache)(ai_question, start_time)
+
+            if served:
+                yield _sse("token", {"text": ai_question.answer})
             else:
-                answer_text = raw_text
-                topic_text = "General"
-
-            end_time = time.time()
-
-            # Update AIQuestion record
-            ai_question.answer = answer_text
-            ai_question.topic = topic_text
-            ai_question.tokens_used = None
-            ai_question.response_time_ms = int((end_time - start_time) * 1000)
-            ai_question.status = "answered"
-            ai_question.answered_at = timezone.now()
-            ai_question.save()
+                prompt = await sync_to_async(build_prompt)(
+                    ai_question.document, ai_question.question, ai_question.group.organization
+                )
+                provider = await sync_to_async(get_provider)()
+                ai_question.ai_model = provider.model
+                answer_filter = AnswerStreamFilter()
+                usage = {}
+                async for piece in provider.stream(prompt, usage):
+                    delta = answer_filter.feed(piece)
+                    if delta:
+                        yield _sse("token", {"text": delta})
+                answer_text, topic_text = parse_answer(answer_filter.raw)
+                await sync_to_async(store_answer)(document, question, answer_text, topic_text, ai_question.ai_model)
+                await sync_to_async(save_answer)(
+                    ai_question, answer_text, topic_text, start_time,
+                    prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"),
+                )
 
-            serializer = AIQuestionSerializer(ai_question)
-            return Response(serializer.data)
+            data = await sync_to_async(lambda: AIQuestionSerializer(ai_question).data)()
+            yield _sse("done", data)
 
         except Exception as e:
             ai_question.status = "failed"
-            ai_question.save()
-            return Response({"error": str(e)}, status=500)
+            await sync_to_async(ai_question.save)()
+            yield _sse("error", {"error": str(e)})
+        finally:
+            if ai_question.status == "processing":
+                # client went away mid-answer (GeneratorExit / CancelledError)
+                ai_question.status = "failed"
+                await sync_to_async(ai_question.save)(update_fields=["status"])
+            if lease:
+                await sync_to_async(in_flight.release)(key, lease)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # let nginx flush every event
+    return response
+
+
+# ---------------------------
+# AI Question Status (polling for async questions)
+# ---------------------------
+class AIQuestionDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, question_id):
+        ai_question = get_object_or_404(AIQuestion, id=question_id, user=request.user)
+        serializer = AIQuestionSerializer(ai_question)
+        return Response(serializer.data)
 
 
 # ---------------------------
@@ -206,3 +321,39 @@ class DocumentTopicsView(APIView):
             .order_by("-question_count")
         )
         return Response({"topics": list(topics)})
+
+
+# ---------------------------
+# Organization AI Usage (tokens / latency)
+# ---------------------------
+class OrganizationAIUsageView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsOrganization]
+
+    def get(self, request):
+        org = request.user
+        usage = dict(
+            questions=Count("id"),
+            cached_answers=Count("id", filter=Q(served_from_cache=True)),
+            prompt_tokens=Sum("prompt_tokens"),
+            completion_tokens=Sum("completion_tokens"),
+            total_tokens=Sum("tokens_used"),
+            avg_response_time_ms=Avg("response_time_ms"),
+        )
+        questions = AIQuestion.objects.filter(group__organization=org)
+
+        by_group = (
+            questions.values("group_id", "group__name")
+            .annotate(**usage)
+            .order_by(F("total_tokens").desc(nulls_last=True))
+        )
+        by_document = (
+            questions.values("document_id", "document__title")
+            .annotate(**usage)
+            .order_by(F("total_tokens").desc(nulls_last=True))[:10]
+        )
+        return Response({
+            "prompt_token_budget": get_prompt_token_budget(org),
+            "totals": questions.aggregate(**usage),
+            "by_group": list(by_group),
+            "top_documents": list(by_document),
+        })
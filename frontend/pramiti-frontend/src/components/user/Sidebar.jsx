@@ -8,20 +8,55 @@ export default function Sidebar({ activeTab, setActiveTab, unreadCount, setUnrea
   const [isOpen, setIsOpen] = useState(false);
   
 
-  const fetchUnreadCount = async () => {
-    try {
-      const { data } = await api.get("/notifications/user/");
-      setUnreadCount(data.unread_count);
-    } catch (err) {
-      console.error(err);
-    }
-  };
-
+  // Unread count pushed over a WebSocket: the socket authenticates with its
+  // first message (tokens stay out of URLs), then the server sends the current
+  // count and one message per new notification. The count is also re-read
+  // every 5 minutes, and every 30s while the socket is down.
   useEffect(() => {
-    fetchUnreadCount();
-    const interval = setInterval(fetchUnreadCount, 30000); // optional: refresh every 30s
-    return () => clearInterval(interval);
-  });
+    const wsUrl = api.defaults.baseURL.replace(/^http/, "ws").replace(/\/api\/?$/, "") + "/ws/notifications/";
+    let socket;
+    let retry;
+    let live = false;
+    let ticks = 0;
+
+    const refreshCount = () => {
+      api.get("/notifications/user/?limit=1")
+        .then(({ data }) => setUnreadCount(data.unread_count))
+        .catch(() => {});
+    };
+
+    const connect = () => {
+      socket = new WebSocket(wsUrl);
+      socket.onopen = () => {
+        socket.send(JSON.stringify({ type: "auth", token: localStorage.getItem("accessToken") }));
+      };
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === "unread_count") {
+          live = true;
+          setUnreadCount(message.unread_count);
+        }
+        if (message.type === "notification") setUnreadCount(prev => prev + 1);
+      };
+      socket.onclose = () => {
+        live = false;
+        retry = setTimeout(connect, 30000); // reconnecting re-sends the count
+      };
+    };
+
+    const poll = setInterval(() => {
+      ticks += 1;
+      if (!live || ticks % 10 === 0) refreshCount();
+    }, 30000);
+
+    connect();
+    return () => {
+      clearTimeout(retry);
+      clearInterval(poll);
+      socket.onclose = null;
+      socket.close();
+    };
+  }, []);
 
   const menuItems = [
     { key: "dashboard", label: "Dashboard", icon: <FaChartLine /> },